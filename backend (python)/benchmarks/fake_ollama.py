@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# Minimal prompt template, rendered by the client with jinja2 like the real ones
+FAKE_TEMPLATE = "{% if system %}System: {{ system }}{% endif %}\nUser: {{ prompt }}\nAssistant:"
+DEFAULT_RESPONSE = "Sure! This is a canned answer of the fake Ollama server, it has a couple of words so streaming has something to stream."
+
+
+class FakeOllamaServer:
+    """
+    Local stand-in for the Ollama HTTP API, serving /api/show, /api/tags and /api/generate (streaming and not) with canned responses.
+    latency is the time until the first token, tokens_per_second the generation speed, words count as tokens.
+    responses maps prompt substrings to the answer returned for prompts containing them, the first match wins.
+    """
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = 0.0, responses: Optional[Dict[str, str]] = None, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.responses = responses or {}
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), _FakeOllamaHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self._server.server_port}/api"  # server_port is the one picked when port 0 was requested
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def respond(self, prompt: str) -> str:
+        for key, response in self.responses.items():
+            if key in prompt:
+                return response
+        return DEFAULT_RESPONSE
+
+    def tokens(self, response: str) -> List[str]:
+        words = response.split(" ")
+        return [word + " " for word in words[:-1]] + words[-1:]
+
+    def token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    server: ThreadingHTTPServer
+
+    @property
+    def fake(self) -> FakeOllamaServer:
+        return self.server.fake  # type: ignore[attr-defined]
+
+    def log_message(self, format: str, *args) -> None:
+        pass  # keep the benchmark output readable
+
+    def _send_json(self, data: dict, status: int = 200) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def do_GET(self) -> None:
+        if self.path == "/api/tags":
+            self._send_json({"models": []})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        data = self._read_json()
+        if self.path == "/api/show":
+            self._send_json({"template": FAKE_TEMPLATE})
+        elif self.path == "/api/generate":
+            self._generate(data)
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def _generate(self, data: dict) -> None:
+        fake = self.fake
+        fake.requests += 1
+        prompt = data.get("prompt", "")
+        tokens = fake.tokens(fake.respond(prompt))
+        stats = {"done": True, "prompt_eval_count": len(prompt.split()), "eval_count": len(tokens), "eval_duration": int(len(tokens) * fake.token_delay() * 1e9)}
+        time.sleep(fake.latency)
+        if not data.get("stream"):
+            time.sleep(len(tokens) * fake.token_delay())
+            self._send_json({"model": data.get("model", ""), "response": "".join(tokens), **stats})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()  # no Content-Length, the HTTP/1.0 connection closes after the last line
+        for token in tokens:
+            self.wfile.write((json.dumps({"model": data.get("model", ""), "response": token, "done": False}) + "\n").encode())
+            self.wfile.flush()
+            time.sleep(fake.token_delay())
+        self.wfile.write((json.dumps({"model": data.get("model", ""), "response": "", **stats}) + "\n").encode())
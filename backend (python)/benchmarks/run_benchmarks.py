@@ -0,0 +1,202 @@
+import os
+import sys
+
+# Add the root directory of your project to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from benchmarks.stub_tts import StubTTS
+from classes.cls_tracer import percentile
+
+RESULTS_PATH = os.path.join(project_root, "benchmarks", "results")
+BASELINE_FILE = os.path.join(RESULTS_PATH, "baseline.json")
+REGRESSION_THRESHOLD = 0.10  # medians this much slower than the baseline are flagged
+FAKE_MODEL = "fake-model"
+
+
+def benchmark(name: str, func: Callable[[], Any], repeat: int, warmup: int = 2) -> Dict[str, float]:
+    for _ in range(warmup):
+        func()
+    durations: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    result = {"repeat": repeat, "median": percentile(durations, 0.5), "p95": percentile(durations, 0.95), "min": min(durations), "mean": sum(durations) / len(durations)}
+    print(f"{name:<45} median {result['median'] * 1000:9.3f} ms   p95 {result['p95'] * 1000:9.3f} ms")
+    return result
+
+
+def synthetic_actions(count: int) -> List[Dict[str, str]]:
+    characters = ["Richard Feynman", "Alice", "Alan Watts"]
+    return [
+        {"character": characters[i % 3], "voice_line": f"This is line {i} of a synthetic episode, long enough to resemble a real voice line of the show.", "looking_at": "Blackboard", "walking_to": "Blackboard"}
+        for i in range(count)
+    ]
+
+
+def build_synthetic_archive(episode_count: int, actions_per_episode: int) -> List[str]:
+    """Publishes episodes shaped like the few-shot example into the store of the working directory, with stub voice lines. Returns their names."""
+    from classes.cls_episode_index import WIP_EPISODES_PATH, get_episode_index
+
+    examples_path = "./few_shot_examples/episodes/"
+    with open(os.path.join(examples_path, sorted(os.listdir(examples_path))[0], "actions.json"), "r") as file:
+        template = json.load(file)
+
+    episode_index = get_episode_index()
+    tts = StubTTS()
+    names: List[str] = []
+    for i in range(episode_count):
+        name = f"0_{FAKE_MODEL}_Synthetic_Topic_{i}"
+        wip_path = os.path.join(WIP_EPISODES_PATH, name)
+        os.makedirs(wip_path, exist_ok=True)
+        episode = dict(template, episode_title=f"Synthetic topic {i}", llm=FAKE_MODEL, actions=synthetic_actions(actions_per_episode))
+        with open(os.path.join(wip_path, "actions.json"), "w") as file:
+            json.dump(episode, file, indent=4)
+        for action_index, action in enumerate(episode["actions"]):
+            tts.tts_to_file(action["voice_line"], os.path.join(wip_path, f"{action_index}_{action['character']}.wav"))
+        episode_index.publish(wip_path, name, "unreleased" if i % 2 else "released")
+        episode_index.set_category(name, "Science")  # categorized once, as it would be after the first run
+        names.append(name)
+    return names
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    # Imported only now, the Ollama client reads OLLAMA_BASE_URL on import
+    from classes.Episode import try_json_to_actions
+    from interface.cls_chat import Chat, Role
+    from interface.cls_few_shot_factory import FewShotProvider
+    from interface.cls_ollama_client import OllamaClient
+    from scripts.restApi import create_app
+
+    repeat = args.repeat
+    results: Dict[str, Dict[str, float]] = {}
+
+    def run(name: str, func: Callable[[], Any], repeat: int = repeat) -> None:
+        if not args.only or any(pattern in name for pattern in args.only):
+            results[name] = benchmark(name, func, repeat)
+
+    client = OllamaClient()
+    run("ollama.generate_completion", lambda: client.generate_completion("Explain Lissajous curves.", FAKE_MODEL))
+    run("ollama.generate_completion.stream", lambda: client.generate_completion("Explain Lissajous curves.", FAKE_MODEL, stream=True))
+
+    chat = Chat("You are a helpful assistant.")
+    for i in range(20):
+        chat.add_message(Role.USER if i % 2 == 0 else Role.ASSISTANT, f"Message {i} " + "lorem ipsum " * 50)
+    chat.add_message(Role.USER, "And the final question?")
+    run("chat.to_jinja2", lambda: chat.to_jinja2(client._get_template(FAKE_MODEL)))
+
+    actions_json = "'''json" + json.dumps(synthetic_actions(60)).replace('"', "'") + "'''"
+    run("try_json_to_actions", lambda: try_json_to_actions(actions_json))
+
+    build_synthetic_archive(args.episodes, args.actions)
+    run("few_shot.get_few_shot_examples", lambda: FewShotProvider.get_few_shot_examples())
+    run("few_shot.get_few_shot_examples.categorized", lambda: FewShotProvider.get_few_shot_examples("Synthetic topic"))
+    run("few_shot.outlineToActions", lambda: FewShotProvider.few_shot_outlineToActions("A synthetic outline of an episode.", FAKE_MODEL))
+
+    app = create_app()
+    api = app.test_client()
+    episode_path = api.get("/chooseEpisodePath").get_json()["episode_path"]
+    run("rest.chooseEpisodePath", lambda: api.get("/chooseEpisodePath"))
+    run("rest.reserveEpisodes", lambda: api.get("/reserveEpisodes?count=3"))
+    run("rest.getEpisode", lambda: api.get("/getEpisode", query_string={"path": episode_path}))
+    run("rest.getEpisode.gzip", lambda: api.get("/getEpisode", query_string={"path": episode_path}, headers={"Accept-Encoding": "gzip"}))
+    audio_query = {"episodePath": episode_path, "character": "Richard Feynman", "actionIndex": 0}
+    run("rest.getAudio", lambda: api.get("/getAudio", query_string=audio_query).close())
+    run("rest.getAudio.range", lambda: api.get("/getAudio", query_string=audio_query, headers={"Range": "bytes=0-65535"}).close())
+    run("rest.getAudioManifest", lambda: api.get("/getAudioManifest", query_string={"episodePath": episode_path}))
+    run("rest.getEpisodeAudio", lambda: api.get("/getEpisodeAudio", query_string={"episodePath": episode_path}).get_data())
+    run("rest.getPoll", lambda: api.get("/getPoll"))
+    votes = {"messages": [{"author": f"viewer{i}", "message": "vote A", "id": str(i)} for i in range(200)]}
+    run("rest.addPollVotes.200", lambda: api.post("/addPollVotes", json=votes))
+    run("rest.metrics", lambda: api.get("/metrics"))
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline_file: str) -> None:
+    with open(baseline_file, "r") as file:
+        baseline = json.load(file)["results"]
+    print(f"\nCompared to {baseline_file}:")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = result["median"] / baseline[name]["median"] - 1
+        color = "\033[91m" if change > REGRESSION_THRESHOLD else "\033[92m" if change < -REGRESSION_THRESHOLD else ""
+        print(f"{color}{name:<45} {baseline[name]['median'] * 1000:9.3f} ms -> {result['median'] * 1000:9.3f} ms  ({change:+.0%})\033[0m")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the backend against a fake Ollama server and a stub TTS, no GPU needed.")
+    parser.add_argument("--repeat", type=int, default=30, help="Timed runs per benchmark")
+    parser.add_argument("--only", nargs="*", help="Only run the benchmarks whose names contain one of these")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds until the fake Ollama server answers")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Generation speed of the fake Ollama server, 0 for instant")
+    parser.add_argument("--episodes", type=int, default=200, help="Episodes in the synthetic archive")
+    parser.add_argument("--actions", type=int, default=40, help="Actions per synthetic episode")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Results file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store the results as the new baseline")
+    args = parser.parse_args()
+
+    # Everything the backend writes (index, caches, episodes) goes to a throwaway working directory
+    work_dir = tempfile.mkdtemp(prefix="llm_classroom_benchmarks_")
+    shutil.copytree(os.path.join(project_root, "few_shot_examples"), os.path.join(work_dir, "few_shot_examples"))
+    os.makedirs(os.path.join(work_dir, "cache", "shared"), exist_ok=True)
+    os.chdir(work_dir)
+    # Only problems reach the console, per request INFO lines would drown the results and cost time themselves
+    from classes.cls_logging import setup_logging
+
+    setup_logging("WARNING", log_file=None)
+
+    responses = {"Transform the narrative": "'''json" + json.dumps(synthetic_actions(8)) + "'''"}
+    try:
+        with FakeOllamaServer(latency=args.latency, tokens_per_second=args.tokens_per_second, responses=responses) as server:
+            os.environ["OLLAMA_BASE_URL"] = server.base_url
+            os.environ["OLLAMA_MANAGE_CONTAINER"] = "0"
+            os.environ["OLLAMA_LATENCY_FILE"] = ""  # the fake model's latencies must not end up in the project's statistics
+            results = run_benchmarks(args)
+    finally:
+        os.chdir(project_root)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report: Dict[str, Any] = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "arguments": {key: value for key, value in vars(args).items() if key not in ("baseline", "save_baseline")},
+        "results": results,
+    }
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    result_file = os.path.join(RESULTS_PATH, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(result_file, "w") as file:
+        json.dump(report, file, indent=4)
+    print(f"\nResults saved to {result_file}")
+
+    baseline_file: Optional[str] = args.baseline if os.path.exists(args.baseline) else None
+    if baseline_file:
+        compare(results, baseline_file)
+    if args.save_baseline:
+        shutil.copyfile(result_file, BASELINE_FILE)
+        print(f"Saved as baseline: {BASELINE_FILE}")
+
+
+if __name__ == "__main__":
+    main()
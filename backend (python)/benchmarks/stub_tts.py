@@ -0,0 +1,25 @@
+import wave
+
+SAMPLE_RATE = 22050
+SECONDS_PER_CHARACTER = 0.06  # about the pace of the real voices
+
+
+class StubTTS:
+    """
+    Drop-in for TTS.api.TTS as used by generateEpisodes.synthesize_speech, writes silent WAV files of a realistic length instead of running a model.
+    """
+
+    def __init__(self, model_name: str = "", gpu: bool = False, progress_bar: bool = False):
+        self.model_name = model_name
+
+    def to(self, device: str) -> "StubTTS":
+        return self
+
+    def tts_to_file(self, text: str, file_path: str, speaker_wav: str | None = None, language: str | None = None, speed: float = 1.0, **kwargs) -> str:
+        frames = int(len(text) * SECONDS_PER_CHARACTER / speed * SAMPLE_RATE)
+        with wave.open(file_path, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(SAMPLE_RATE)
+            wav_file.writeframes(b"\x00\x00" * frames)
+        return file_path
@@ -1,4 +1,35 @@
+import base64
 import json
+import os
+from typing import Optional
+
+BLACKBOARD_IMAGE_NAME = "blackboard_image"
+IMAGE_MIMETYPES = {
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".bmp": "image/bmp",
+}
+
+
+def image_extension(image_data: bytes) -> str:
+    """Guesses the file extension from the magic bytes of the image."""
+    if image_data.startswith(b"\x89PNG"):
+        return ".png"
+    if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+        return ".webp"
+    if image_data.startswith(b"BM"):
+        return ".bmp"
+    return ".jpg"
+
+
+def find_blackboard_image(episode_path: str) -> Optional[str]:
+    """Returns the path of the sidecar blackboard image of an episode folder, None for episodes without one."""
+    for extension in IMAGE_MIMETYPES:
+        image_path = os.path.join(episode_path, BLACKBOARD_IMAGE_NAME + extension)
+        if os.path.exists(image_path):
+            return image_path
+    return None
 
 
 class DisplayableContent:
@@ -7,17 +38,35 @@ class DisplayableContent:
         blackboard_caption: str = "",
         blackboard_image: str = "",
         blackboard_graph: str = "",
+        blackboard_image_file: str = "",
     ):
+        """
+        :param blackboard_image: base64 Image, only written into actions.json by episodes from before the sidecar files.
+        :param blackboard_image_file: Name of the sidecar image file next to the episode's actions.json, served by /getImage and inlined by /getEpisode.
+        """
         self.blackboard_caption: str = blackboard_caption
         self.blackboard_image: str = blackboard_image
         self.blackboard_graph: str = blackboard_graph
+        self.blackboard_image_file: str = blackboard_image_file
 
     def to_json(self):
-        """Convert instance to JSON string."""
-        return self.__dict__
+        """Convert instance to JSON, an image stored in its sidecar file is only referenced by name."""
+        data = dict(self.__dict__)
+        if self.blackboard_image_file:
+            del data["blackboard_image"]
+        return data
 
     @classmethod
     def from_json(cls, json_str):
         """Create instance from JSON string."""
         attributes = json.loads(json_str)
         return cls(**attributes)
+
+    def save_image(self, episode_path: str) -> None:
+        """Writes the base64 blackboard image as binary sidecar file into the episode folder."""
+        if not self.blackboard_image:
+            return
+        image_data = base64.b64decode(self.blackboard_image)
+        self.blackboard_image_file = BLACKBOARD_IMAGE_NAME + image_extension(image_data)
+        with open(os.path.join(episode_path, self.blackboard_image_file), "wb") as file:
+            file.write(image_data)
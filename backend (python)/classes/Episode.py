@@ -1,17 +1,23 @@
 import asyncio
 import base64
 import json
+import logging
 import os
 import shutil
 from typing import List
 
 from classes.Action import Action
+from classes.cls_episode_meta import EpisodeMeta
+from classes.cls_scraper_cache import get_scraper_cache, hash_image_bytes
+from classes.cls_tracer import traced
 from classes.cls_web_scraper import WebScraper
 from classes.DisplayableContent import DisplayableContent
 from classes.Location import Location
 from interface.cls_few_shot_factory import FewShotProvider
 from interface.cls_ollama_client import OllamaClient
 
+logger = logging.getLogger(__name__)
+
 
 def try_json_to_actions(json_string: str) -> list[Action]:
     return [Action.from_dict(action_dict) for action_dict in try_dict_to_actions(json_string)]
@@ -136,6 +142,13 @@ class Episode:
             indent=4,
         )
 
+    def save(self, episode_path: str, created_at: float = 0.0) -> None:
+        """Writes the episode's actions.json and meta.json into the folder, the blackboard image is stored next to them as binary sidecar file instead of inline."""
+        self.displayable_content.save_image(episode_path)
+        with open(os.path.join(episode_path, "actions.json"), "w") as json_file:
+            json_file.write(self.to_json())
+        EpisodeMeta.from_episode(self, created_at).save(episode_path)
+
     @classmethod
     def from_json(cls, json_str: str, llm:str, load_only: bool = False):
         data: dict = json.loads(json_str)
@@ -163,14 +176,25 @@ class Episode:
 
         return episode
 
+    @traced
     def generate_displayableContent(self, topic: str) -> None:
+        def describe_image(base64_image: str) -> str:
+            image_hash = hash_image_bytes(base64.b64decode(base64_image))
+            image_description = get_scraper_cache().get_description(image_hash)
+            if image_description:
+                return image_description
+            image_description = self.session.generate_completion(
+                f"What is shown in the image?",
+                "llava:v1.6",
+                images=[base64_image],
+            )
+            if image_description:
+                get_scraper_cache().record_description(image_hash, image_description)
+            return image_description
+
         def try_web_image_search(search_term: str) -> tuple[str, str]:
             def image_fits_topic(base64_image: str) -> bool:
-                image_description: str = self.session.generate_completion(
-                    f"What is shown in the image?",
-                    "llava:v1.6",
-                    images=[base64_image],
-                )
+                image_description: str = describe_image(base64_image)
                 i: int = len([f for f in os.listdir("./cache/scraped_images/")])
                 with open(f"./cache/scraped_images/{str(i)}.jpg", "wb") as file:
                     file.write(base64.b64decode(base64_image))
@@ -180,27 +204,23 @@ class Episode:
                 is_topic_appropriate_response:str = FewShotProvider.few_shot_isImageTopicAppropriate(self.episode_title, image_description, self.llm)
                 is_topic_appropriate_response = FewShotProvider.few_shot_convertToYesNo(is_topic_appropriate_response, self.llm)
 
-                print("\033[92m" + "SEARCHED KEYWORD: " + search_term + "\033[0m")
-                print("\033[92m" + "TOPIC: " + topic + "\033[0m")
-                print("image_content_response: " + image_description)
-                print("is_topic_appropriate_response: " + is_topic_appropriate_response)
+                logger.info(
+                    "Judged image",
+                    extra={"search_term": search_term, "topic": topic, "image_description": image_description, "is_topic_appropriate": is_topic_appropriate_response},
+                )
 
                 return "yes" in is_topic_appropriate_response.lower()
 
             shutil.rmtree("./cache/scraped_images")
             os.makedirs("./cache/scraped_images", exist_ok=True)
 
-            scraper = WebScraper(search_term)
+            scraper = WebScraper(search_term, topic=self.episode_title)
             fitting_image_base64 = scraper.get_images_as_base64(image_fits_topic)
 
             if fitting_image_base64:
                 with open(f"./cache/scraped_images/true_image.jpg", "wb") as file:
                     file.write(base64.b64decode(fitting_image_base64))
-                image_description: str = self.session.generate_completion(
-                    f"What is shown in the image?",
-                    "llava:v1.6",
-                    images=[fitting_image_base64],
-                )
+                image_description: str = describe_image(fitting_image_base64)
                 image_title: str = self.session.generate_completion(
                     f"Come up with a title for the image. Here is the image description: '{image_description}'",
                     self.llm,
@@ -297,7 +317,7 @@ class Episode:
         scraped_visualization, image_title = try_web_image_search(topic)
         while not scraped_visualization:
             modified_search_term: str = FewShotProvider.few_shot_topicToSearch(topic, self.llm)
-            print(f"\033[91m Did not find any appropriate image on the web! New search term: {modified_search_term}\033[0m")
+            logger.warning("Did not find any appropriate image on the web", extra={"new_search_term": modified_search_term})
             scraped_visualization, image_title = try_web_image_search(modified_search_term)
             
         if scraped_visualization:
@@ -316,6 +336,7 @@ class Episode:
 
             self.displayable_content.blackboard_caption = blackboard_caption
 
+    @traced
     def generate_actions(self, regenerate_outline: bool = False) -> None:
         if (not self.outline) or regenerate_outline:
             self.outline = FewShotProvider.few_shot_topicToEpisodeOutline(
@@ -333,12 +354,12 @@ class Episode:
                 actions = try_json_to_actions(actions_str)
                 temperature -= 0.1
                 if not actions:
-                    raise Exception(f"\033[91mWarning: Received json actions has invalid format. Adjusting temperature to {temperature} and retrying...\033[0m")
+                    raise Exception(f"Received json actions has invalid format. Adjusting temperature to {temperature} and retrying...")
                 if len(actions) < 4:
-                    raise Exception(f"\033[91mWarning: Actions have a too short length of {len(actions)}. Adjusting temperature to {temperature} and retrying...\033[0m")
+                    raise Exception(f"Actions have a too short length of {len(actions)}. Adjusting temperature to {temperature} and retrying...")
                 break
             except Exception as e:
-                print(e)
+                logger.warning(str(e))
                 if temperature <= 0.1:
                     return self.generate_actions(True)  # The outline seems to break the few_shot_outlineToActions method, let's generate a new outline an retry
         # self.actions = [Action.from_dict(action for action in actions]
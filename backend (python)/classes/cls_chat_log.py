@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+from typing import List, Set, Tuple
+
+from interface.cls_livestream_message import LivestreamMessage
+
+CHAT_LOG_FILE = "./cache/chat_log.jsonl"
+LEGACY_CHAT_FILE = "./cache/fullChat.json"
+
+logger = logging.getLogger(__name__)
+
+
+class ChatLog:
+    """
+    Append-only JSON Lines log of every livestream chat message, one message per line.
+    The ids of the logged messages are read once before the first append, after that storing messages only costs as much as the new ones.
+    Readers keep a byte offset into the log, so consumers like the topic extraction only ever read what they have not seen.
+    """
+
+    def __init__(self, log_file: str = CHAT_LOG_FILE, legacy_file: str = LEGACY_CHAT_FILE):
+        self.log_file = log_file
+        self.message_ids: Set[str] = set()
+        self._loaded = False  # readers never need the ids
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        if not os.path.exists(log_file) and os.path.exists(legacy_file):
+            self._import_legacy(legacy_file)
+
+    def _import_legacy(self, legacy_file: str) -> None:
+        """One time migration of the former fullChat.json, which was rewritten as a whole on every update."""
+        try:
+            with open(legacy_file, "r") as file:
+                messages = [LivestreamMessage.from_dict(item) for item in json.load(file)]
+        except (json.JSONDecodeError, KeyError) as e:
+            logger.error(f"Could not import {legacy_file}: {e}")
+            return
+        self.append(messages)
+        logger.info(f"Imported {len(messages)} messages of {legacy_file} into {self.log_file}")
+
+    def _load(self) -> None:
+        self._loaded = True
+        if not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, "rb+") as file:
+            valid_length = 0
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # torn by a crash during the last append
+                valid_length += len(line)
+                self.message_ids.add(json.loads(line)["id"])
+            file.truncate(valid_length)
+
+    def append(self, messages: List[LivestreamMessage]) -> List[LivestreamMessage]:
+        """Logs the messages that are not logged yet and returns them."""
+        if not self._loaded:
+            self._load()
+        new_messages: List[LivestreamMessage] = []
+        for message in messages:
+            if message.id not in self.message_ids:
+                self.message_ids.add(message.id)
+                new_messages.append(message)
+        if new_messages:
+            with open(self.log_file, "a") as file:
+                file.write("".join(json.dumps(message.to_dict()) + "\n" for message in new_messages))
+        return new_messages
+
+    def end_offset(self) -> int:
+        """Byte offset behind the last complete message, a reader starting there only sees the messages logged from now on."""
+        offset = 0
+        if os.path.exists(self.log_file):
+            with open(self.log_file, "rb") as file:
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        break  # still being written
+                    offset += len(line)
+        return offset
+
+    def read_from(self, offset: int = 0) -> Tuple[List[LivestreamMessage], int]:
+        """Returns the messages logged after the byte offset and the offset to continue reading from."""
+        if not os.path.exists(self.log_file):
+            return [], offset
+        messages: List[LivestreamMessage] = []
+        with open(self.log_file, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # still being written
+                offset += len(line)
+                messages.append(LivestreamMessage.from_dict(json.loads(line)))
+        return messages, offset
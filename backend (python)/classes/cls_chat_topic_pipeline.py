@@ -0,0 +1,74 @@
+import json
+import logging
+import re
+from typing import List, Set
+
+from classes.cls_chat_log import ChatLog
+from classes.cls_episode_index import EpisodeIndex
+from classes.cls_poll import parse_vote
+from classes.cls_topic_queue import TopicQueue, normalize_title
+from interface.cls_few_shot_factory import FewShotProvider
+from interface.cls_livestream_message import LivestreamMessage
+
+BATCH_SIZE = 50  # messages per topic extraction call
+MIN_MESSAGE_LENGTH = 8  # shorter messages are greetings or emotes, not requests
+
+logger = logging.getLogger(__name__)
+
+
+def parse_topics(response: str) -> List[str]:
+    """Reads the topic list out of the model's response, which should be a JSON list of strings but isn't always."""
+    match = re.search(r"\[.*\]", response, re.DOTALL)
+    if match:
+        try:
+            return [str(topic).strip() for topic in json.loads(match.group(0)) if str(topic).strip()]
+        except json.JSONDecodeError:
+            pass
+    return [topic.strip(" \"'[]\n") for topic in response.split(",") if topic.strip(" \"'[]\n")]
+
+
+class ChatTopicPipeline:
+    """
+    Turns the new messages of the chat log into episode topics for the generator.
+    Messages are read from the offset stored in the topic queue, votes and chatter are dropped, the rest is condensed
+    in one LLM call per batch. Topics matching an existing episode are dropped, requesting a queued topic again raises its priority.
+    """
+
+    def __init__(self, chat_log: ChatLog, topic_queue: TopicQueue, index: EpisodeIndex, llm: str, batch_size: int = BATCH_SIZE):
+        self.chat_log = chat_log
+        self.topic_queue = topic_queue
+        self.index = index
+        self.llm = llm
+        self.batch_size = batch_size
+
+    @staticmethod
+    def is_topic_candidate(message: LivestreamMessage) -> bool:
+        return len(message.message.strip()) >= MIN_MESSAGE_LENGTH and parse_vote(message.message) is None
+
+    def process_new_messages(self) -> List[str]:
+        """Extracts and queues the topics of the messages logged since the last call, returns the newly queued ones."""
+        if self.topic_queue.chat_offset is None:
+            # First run: the chat so far, the imported fullChat.json included, was never meant as topic requests
+            self.topic_queue.chat_offset = self.chat_log.end_offset()
+            self.topic_queue.save()
+            return []
+        messages, offset = self.chat_log.read_from(self.topic_queue.chat_offset)
+        candidates = [message for message in messages if self.is_topic_candidate(message)]
+        episode_titles: Set[str] = {normalize_title(episode.title) for episode in self.index.list()}
+
+        new_topics: List[str] = []
+        for i in range(0, len(candidates), self.batch_size):
+            response = FewShotProvider.few_shot_LivestreamMessagesToTopics(candidates[i : i + self.batch_size], self.llm)
+            for topic in parse_topics(response):
+                if normalize_title(topic) in episode_titles:
+                    continue
+                if topic not in self.topic_queue:
+                    new_topics.append(topic)
+                self.topic_queue.push(topic)
+
+        if messages:
+            self.topic_queue.chat_offset = offset
+            self.topic_queue.save()
+        if new_topics:
+            logger.info(f"Queued {len(new_topics)} chat topics", extra={"topics": new_topics})
+        return new_topics
@@ -0,0 +1,259 @@
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from classes.cls_episode_meta import EpisodeMeta
+
+STREAMING_ASSETS_PATH = "./cache/shared/StreamingAssets/"
+WIP_EPISODES_PATH = "./cache/shared/WIP_episodes/"  # on the same filesystem as the store, so publishing is a rename
+EPISODE_STATES = ("prioritized", "unreleased", "released")
+READY_MARKER = ".ready"
+
+logger = logging.getLogger(__name__)
+
+
+def state_directory(state: str) -> str:
+    """Folder of the StreamingAssets store holding the episodes of a state."""
+    return f"{STREAMING_ASSETS_PATH}{state}_episodes/"
+
+
+def is_ready(episode_path: str) -> bool:
+    """Only episodes carrying the ready-marker are complete and may be served."""
+    return os.path.exists(os.path.join(episode_path, READY_MARKER))
+
+
+def mark_ready(episode_path: str) -> None:
+    with open(os.path.join(episode_path, READY_MARKER), "w") as file:
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def split_episode_name(name: str) -> tuple[int, str]:
+    """Splits an episode folder name like '3_orca2_Fractals' into its version and identifier."""
+    version, _, identifier = name.partition("_")
+    if version.isdigit() and identifier:
+        return int(version), identifier
+    return 0, name
+
+
+class IndexedEpisode:
+    def __init__(self, row: sqlite3.Row):
+        self.name: str = row["name"]
+        self.identifier: str = row["identifier"]
+        self.version: int = row["version"]
+        self.state: str = row["state"]
+        self.title: str = row["title"]
+        self.category: str = row["category"]
+        self.llm: str = row["llm"]
+        self.action_count: int = row["action_count"]
+        self.play_count: int = row["play_count"]
+        self.created_at: float = row["created_at"]
+        self.updated_at: float = row["updated_at"]
+        self.validated_mtime: float = row["validated_mtime"]
+        self.reserved_at: float = row["reserved_at"]
+
+    @property
+    def path(self) -> str:
+        return os.path.join(state_directory(self.state), self.name)
+
+
+class EpisodeIndex:
+    """
+    SQLite index of the StreamingAssets episode store, shared by the generator and the REST API.
+    The directories stay the source of truth: every move on disk is mirrored here and sync() reconciles both after a restart.
+    """
+
+    def __init__(self, db_path: str = "./cache/shared/episode_index.sqlite3"):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.RLock()
+        self.connection = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")  # readers of the REST API don't block the generator's writes
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS episodes (
+                name TEXT PRIMARY KEY,
+                identifier TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                title TEXT NOT NULL DEFAULT '',
+                category TEXT NOT NULL DEFAULT '',
+                llm TEXT NOT NULL DEFAULT '',
+                action_count INTEGER NOT NULL DEFAULT 0,
+                play_count INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL DEFAULT 0,
+                validated_mtime REAL NOT NULL DEFAULT 0,
+                reserved_at REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS episodes_state ON episodes (state, created_at);
+            CREATE INDEX IF NOT EXISTS episodes_identifier ON episodes (identifier, version);
+            """
+        )
+        columns = [row["name"] for row in self._execute("PRAGMA table_info(episodes)")]
+        if "validated_mtime" not in columns:  # indexes created before validation was tracked
+            self._execute("ALTER TABLE episodes ADD COLUMN validated_mtime REAL NOT NULL DEFAULT 0")
+        if "reserved_at" not in columns:  # indexes created before reservations were persisted
+            self._execute("ALTER TABLE episodes ADD COLUMN reserved_at REAL NOT NULL DEFAULT 0")
+
+    def _execute(self, sql: str, parameters: Sequence = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def sync(self, prepare_episode: Optional[Callable[[str], None]] = None) -> None:
+        """
+        Reconciles the index with the state directories, the only place that still scans them.
+        :param prepare_episode: Called with the path of every episode folder that is not indexed yet, before it is read. It may delete the folder or mark it ready.
+        Folders without the ready-marker are left out of the index.
+        The episodes are prepared and read before the write transaction, so it stays short and the REST API's writes never wait for the migrations.
+        """
+        on_disk: dict[str, str] = {}
+        for state in EPISODE_STATES:
+            os.makedirs(state_directory(state), exist_ok=True)
+            for name in os.listdir(state_directory(state)):
+                if os.path.isdir(os.path.join(state_directory(state), name)):
+                    on_disk[name] = state
+
+        indexed = {row["name"]: row["state"] for row in self._execute("SELECT name, state FROM episodes")}
+        to_insert: List[Tuple[str, str, EpisodeMeta]] = []
+        for name, state in on_disk.items():
+            if name in indexed:
+                continue
+            episode_path = os.path.join(state_directory(state), name)
+            if prepare_episode:
+                prepare_episode(episode_path)
+                if not os.path.exists(episode_path):
+                    continue
+            if not is_ready(episode_path):
+                continue
+            try:
+                to_insert.append((name, state, EpisodeMeta.load(episode_path)))
+            except Exception as e:
+                logger.error(f"Could not index episode {name}: {e}")
+
+        with self._lock:
+            self._execute("BEGIN")
+            try:
+                for name in indexed.keys() - on_disk.keys():
+                    self._execute("DELETE FROM episodes WHERE name = ?", (name,))
+                for name, state, meta in to_insert:
+                    self._insert(name, state, meta)
+                for name, state in on_disk.items():
+                    if name in indexed and indexed[name] != state:
+                        self._execute("UPDATE episodes SET state = ?, updated_at = ? WHERE name = ?", (state, time.time(), name))
+                self._execute("COMMIT")
+            except Exception:
+                self._execute("ROLLBACK")
+                raise
+
+    def _insert(self, name: str, state: str, meta: EpisodeMeta) -> None:
+        version, identifier = split_episode_name(name)
+        self._execute(
+            "INSERT OR REPLACE INTO episodes (name, identifier, version, state, title, llm, action_count, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, identifier, version, state, meta.episode_title, meta.llm, meta.action_count, meta.created_at, time.time()),
+        )
+
+    def add(self, name: str, state: str, meta: EpisodeMeta) -> None:
+        self._insert(name, state, meta)
+
+    def publish(self, wip_path: str, name: str, state: str = "prioritized") -> str:
+        """Marks a finished WIP episode folder ready and moves it into the store with a single atomic rename, returns its new path."""
+        os.makedirs(state_directory(state), exist_ok=True)  # the store may not have been synced yet
+        episode_path = os.path.join(state_directory(state), name)
+        mark_ready(wip_path)
+        os.rename(wip_path, episode_path)
+        self.add(name, state, EpisodeMeta.load(episode_path))
+        return episode_path
+
+    def move(self, name: str, from_state: str, to_state: str) -> str:
+        """Moves an episode between state directories with an atomic rename, returns its new path. Raises FileNotFoundError if it was moved by someone else."""
+        os.makedirs(state_directory(to_state), exist_ok=True)
+        episode_path = os.path.join(state_directory(to_state), name)
+        if os.path.exists(episode_path):
+            shutil.rmtree(episode_path, True)
+        os.rename(os.path.join(state_directory(from_state), name), episode_path)
+        self.set_state(name, to_state)
+        return episode_path
+
+    def remove(self, name: str) -> None:
+        self._execute("DELETE FROM episodes WHERE name = ?", (name,))
+
+    def set_state(self, name: str, state: str) -> None:
+        """Moving an episode ends its reservation, it was either played or is re-queued."""
+        self._execute("UPDATE episodes SET state = ?, reserved_at = 0, updated_at = ? WHERE name = ?", (state, time.time(), name))
+
+    def set_reserved(self, name: str, reserved_at: float) -> None:
+        """Reserves an episode for prefetching at the given time, 0 cancels the reservation. The episode stays in its state until it is played."""
+        self._execute("UPDATE episodes SET reserved_at = ? WHERE name = ?", (reserved_at, name))
+
+    def list_reserved(self) -> List[IndexedEpisode]:
+        """Reserved episodes, oldest reservation first."""
+        return [IndexedEpisode(row) for row in self._execute("SELECT * FROM episodes WHERE reserved_at > 0 ORDER BY reserved_at, name")]
+
+    def count_reserved(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM episodes WHERE reserved_at > 0")[0][0]
+
+    def set_validated(self, validated: Iterable[Tuple[str, float]]) -> None:
+        """Stores the actions.json mtime every (name, mtime) pair was validated at, in one transaction."""
+        with self._lock:
+            self._execute("BEGIN")
+            try:
+                self.connection.executemany("UPDATE episodes SET validated_mtime = ? WHERE name = ?", [(mtime, name) for name, mtime in validated])
+                self._execute("COMMIT")
+            except Exception:
+                self._execute("ROLLBACK")
+                raise
+
+    def record_play(self, name: str) -> None:
+        self._execute("UPDATE episodes SET play_count = play_count + 1, updated_at = ? WHERE name = ?", (time.time(), name))
+
+    def set_category(self, name: str, category: str) -> None:
+        self._execute("UPDATE episodes SET category = ? WHERE name = ?", (category, name))
+
+    def get(self, name: str) -> Optional[IndexedEpisode]:
+        rows = self._execute("SELECT * FROM episodes WHERE name = ?", (name,))
+        return IndexedEpisode(rows[0]) if rows else None
+
+    def list(self, *states: str) -> List[IndexedEpisode]:
+        """Episodes of the given states (all if none are given), oldest first."""
+        states = states or EPISODE_STATES
+        rows = self._execute(f"SELECT * FROM episodes WHERE state IN ({', '.join('?' * len(states))}) ORDER BY created_at, name", states)
+        return [IndexedEpisode(row) for row in rows]
+
+    def count(self, state: str) -> int:
+        return self._execute("SELECT COUNT(*) FROM episodes WHERE state = ?", (state,))[0][0]
+
+    def count_created_since(self, timestamp: float) -> int:
+        return self._execute("SELECT COUNT(*) FROM episodes WHERE created_at >= ?", (timestamp,))[0][0]
+
+    def data_version(self) -> int:
+        """Changes whenever another connection, e.g. the generator's, committed to the index."""
+        return self._execute("PRAGMA data_version")[0][0]
+
+    def next_version(self, identifier: str) -> int:
+        """
+        Version number following the highest one used by an episode with this identifier.
+        Folders sync() could not index still occupy their name, so the version is advanced until no state directory holds it.
+        """
+        max_version = self._execute("SELECT MAX(version) FROM episodes WHERE identifier = ?", (identifier,))[0][0]
+        version = 0 if max_version is None else max_version + 1
+        while any(os.path.exists(os.path.join(state_directory(state), f"{version}_{identifier}")) for state in EPISODE_STATES):
+            version += 1
+        return version
+
+
+_episode_index: Optional[EpisodeIndex] = None
+_episode_index_lock = threading.Lock()
+
+
+def get_episode_index() -> EpisodeIndex:
+    """Index of the store in the working directory shared within the process, opened on first use so importing this module creates no files."""
+    global _episode_index
+    with _episode_index_lock:
+        if _episode_index is None:
+            _episode_index = EpisodeIndex()
+        return _episode_index
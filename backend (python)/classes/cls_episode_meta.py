@@ -0,0 +1,64 @@
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+META_FILE_NAME = "meta.json"
+
+
+class EpisodeMeta:
+    """Small summary of an episode stored as meta.json next to its actions.json, so listings don't need to parse the full episode."""
+
+    def __init__(self, episode_title: str, characters: List[str], action_count: int, llm: str = "", created_at: float = 0.0):
+        """
+        :param llm: Model that authored the episode, empty if unknown.
+        :param created_at: Unix timestamp of the episode's generation.
+        """
+        self.episode_title = episode_title
+        self.characters = characters
+        self.action_count = action_count
+        self.llm = llm
+        self.created_at = created_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self.__dict__
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EpisodeMeta":
+        return cls(
+            episode_title=data["episode_title"],
+            characters=data.get("characters", []),
+            action_count=int(data.get("action_count", 0)),
+            llm=data.get("llm", ""),
+            created_at=float(data.get("created_at", 0.0)),
+        )
+
+    @classmethod
+    def from_episode(cls, episode, created_at: float = 0.0) -> "EpisodeMeta":
+        """Summarizes an Episode or struct_Episode."""
+        return cls(episode.episode_title, episode.characters, len(episode.actions), episode.llm, created_at or time.time())
+
+    @staticmethod
+    def exists(episode_path: str) -> bool:
+        return os.path.exists(os.path.join(episode_path, META_FILE_NAME))
+
+    def save(self, episode_path: str) -> None:
+        with open(os.path.join(episode_path, META_FILE_NAME), "w") as json_file:
+            json.dump(self.to_dict(), json_file, indent=4)
+
+    @classmethod
+    def load(cls, episode_path: str) -> "EpisodeMeta":
+        """Reads the meta.json of an episode folder, for episodes without one it is derived from their actions.json. Never writes, the generator migrates those episodes."""
+        meta_path = os.path.join(episode_path, META_FILE_NAME)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as json_file:
+                return cls.from_dict(json.load(json_file))
+        return cls.derive(episode_path)
+
+    @classmethod
+    def derive(cls, episode_path: str) -> "EpisodeMeta":
+        """Summarizes the actions.json of an episode folder."""
+        actions_path = os.path.join(episode_path, "actions.json")
+        with open(actions_path, "r") as json_file:
+            data: dict = json.load(json_file)
+        return cls(data["episode_title"], data["characters"], len(data["actions"]), data.get("llm", ""), os.path.getmtime(actions_path))
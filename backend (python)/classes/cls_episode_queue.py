@@ -0,0 +1,46 @@
+import threading
+from collections import deque
+from typing import Deque, Optional, Set
+
+from classes.cls_episode_index import EpisodeIndex, IndexedEpisode
+
+PENDING_STATES = ("prioritized", "unreleased")  # serving order, prioritized (boosted) episodes first
+
+
+class EpisodeQueue:
+    """
+    In-process queue of the episodes waiting to be released, in serving order: prioritized before unreleased, oldest first.
+    The generator publishes through the episode index, so the queue is only rebuilt after another connection committed to it,
+    which SQLite reports through PRAGMA data_version without reading any rows.
+    """
+
+    def __init__(self, index: EpisodeIndex):
+        self.index = index
+        self._lock = threading.Lock()
+        self._pending: Deque[IndexedEpisode] = deque()
+        self._taken: Set[str] = set()  # handed out but maybe not moved to released yet, never queued again
+        self._data_version: Optional[int] = None
+
+    def _refresh(self) -> None:
+        data_version = self.index.data_version()
+        if data_version == self._data_version:
+            return
+        pending = [episode for state in PENDING_STATES for episode in self.index.list(state) if not episode.reserved_at]  # reservations are played first
+        self._taken &= {episode.name for episode in pending}
+        self._pending = deque(episode for episode in pending if episode.name not in self._taken)
+        self._data_version = data_version
+
+    def pop(self) -> Optional[IndexedEpisode]:
+        """Takes the next episode off the queue, None if nothing is waiting. Every episode is handed out once, even to concurrent requests."""
+        with self._lock:
+            self._refresh()
+            if not self._pending:
+                return None
+            episode = self._pending.popleft()
+            self._taken.add(episode.name)
+            return episode
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._pending)
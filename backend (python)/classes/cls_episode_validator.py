@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from classes.cls_episode_index import EpisodeIndex, IndexedEpisode
+
+MIN_ACTIONS = 5
+
+logger = logging.getLogger(__name__)
+
+
+def check_episode(episode_path: str) -> str:
+    """Fully parses an episode's actions.json, returns the reason it is faulty or an empty string. Runs in worker threads, so it only touches the file."""
+    try:
+        with open(os.path.join(episode_path, "actions.json"), "r") as file:
+            data: dict = json.load(file)
+        for key in ("show_title", "episode_title", "characters", "location"):
+            if key not in data:
+                return f"missing '{key}'"
+        if len(data["actions"]) < MIN_ACTIONS:
+            return f"only {len(data['actions'])} actions"
+        for action in data["actions"]:
+            if "character" not in action:
+                return "action without character"
+        return ""
+    except Exception as e:
+        return str(e)
+
+
+def validate_episodes(index: EpisodeIndex, prepare_episode: Optional[Callable[[str], None]] = None, max_workers: Optional[int] = None) -> None:
+    """
+    Syncs the index and checks every episode whose actions.json changed since its last validation, faulty episodes are deleted.
+    :param prepare_episode: Passed on to EpisodeIndex.sync for episodes that are not indexed yet.
+    """
+    start_time = time.time()
+    index.sync(prepare_episode)
+    episodes = index.list()
+
+    to_check: List[Tuple[IndexedEpisode, float]] = []
+    for episode in episodes:
+        try:
+            mtime = os.path.getmtime(os.path.join(episode.path, "actions.json"))
+        except OSError:
+            mtime = -1  # checking it will report the missing file
+        if mtime != episode.validated_mtime:
+            to_check.append((episode, mtime))
+
+    reasons: List[str] = []
+    if to_check:
+        # Threads, not processes: the generator has loaded the TTS models and holds a sqlite connection and the logging thread, forking that state is unsafe.
+        # Spawned processes would re-run generateEpisodes.py, and reading the files dominates the parsing anyway.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            reasons = list(executor.map(check_episode, [episode.path for episode, _ in to_check]))
+
+    validated: List[Tuple[str, float]] = []
+    deleted = 0
+    for (episode, mtime), reason in zip(to_check, reasons):
+        if reason:
+            logger.warning("Deleting faulty episode", extra={"reason": reason, "episode_path": episode.path})
+            shutil.rmtree(episode.path, True)
+            index.remove(episode.name)
+            deleted += 1
+        else:
+            validated.append((episode.name, mtime))
+    index.set_validated(validated)
+
+    logger.info(
+        f"Validated {len(episodes)} episodes in {time.time() - start_time:.1f} seconds",
+        extra={"unchanged": len(episodes) - len(to_check), "checked": len(validated), "deleted": deleted},
+    )
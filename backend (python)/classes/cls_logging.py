@@ -0,0 +1,83 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+
+LOG_LEVEL_ENV = "LLM_CLASSROOM_LOG_LEVEL"  # e.g. DEBUG for every request and completion, WARNING for problems only
+LOG_FILE = "./cache/logs/backend.jsonl"
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+
+
+def record_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    """The structured fields passed with extra={...}."""
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRIBUTES}
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Message followed by its fields as key=value, coloured by level."""
+
+    COLORS = {logging.DEBUG: "\033[90m", logging.WARNING: "\033[93m", logging.ERROR: "\033[91m", logging.CRITICAL: "\033[91m"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        fields = record_fields(record)
+        if fields:
+            message += "\t" + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+        color = self.COLORS.get(record.levelno)
+        return f"{color}{message}\033[0m" if color else message
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the record's fields at the top level."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {"time": record.created, "level": record.levelname, "logger": record.name, "message": record.getMessage(), **record_fields(record)}
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+def setup_logging(level: Optional[str] = None, log_file: Optional[str] = LOG_FILE) -> None:
+    """
+    Routes all logging through a queue to a background thread that writes to the console and the JSON Lines log file,
+    so logging never blocks the caller on console or disk I/O. Replaces handlers installed before, e.g. by logging.basicConfig.
+    :param level: Defaults to the LLM_CLASSROOM_LOG_LEVEL environment variable, else INFO.
+    """
+    global _listener
+    if _listener:
+        _listener.stop()
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(ConsoleFormatter())
+    handlers: list[logging.Handler] = [console_handler]
+    if log_file:
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        file_handler = RotatingFileHandler(log_file, maxBytes=1024 * 1024 * 100, backupCount=5)
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel((level or os.getenv(LOG_LEVEL_ENV) or "INFO").upper())
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    if _listener:
+        _listener.stop()  # writes out what is still queued
+
+
+atexit.register(_stop_listener)
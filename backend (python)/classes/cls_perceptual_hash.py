@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8  # 8x8 bits -> 64 bit hashes
+MAX_DHASH_DISTANCE = 6  # Hamming distances up to which two images count as near-duplicates
+MAX_AHASH_DISTANCE = 10
+UNUSED_ENTRY_TTL = 30 * 24 * 60 * 60  # Images never shown in an episode are forgotten with their verdicts, see VERDICT_TTL of the scraper cache
+MAX_UNUSED_ENTRIES = 20_000  # Beyond this the oldest images never shown in an episode are forgotten
+
+
+def _grayscale_pixels(image: Image.Image, size: Tuple[int, int]) -> np.ndarray:
+    image.draft("L", (size[0] * 4, size[1] * 4))  # lets JPEG decoding skip most of the full resolution work
+    return np.asarray(image.convert("L").resize(size, Image.Resampling.LANCZOS), dtype=np.float32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
+
+
+def average_hash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """aHash: every bit tells whether a pixel of the downscaled image is brighter than the mean."""
+    pixels = _grayscale_pixels(image, (hash_size, hash_size))
+    return _bits_to_int(pixels > pixels.mean())
+
+
+def difference_hash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """dHash: every bit tells whether a pixel is brighter than its right neighbour, robust against scaling and re-encoding."""
+    pixels = _grayscale_pixels(image, (hash_size + 1, hash_size))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def perceptual_hashes(image_data: bytes) -> Tuple[int, int]:
+    """Returns the (dHash, aHash) pair of the raw image bytes."""
+    return difference_hash(Image.open(BytesIO(image_data))), average_hash(Image.open(BytesIO(image_data)))
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Hamming distances between every uint64 in hashes and value."""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class PerceptualHashIndex:
+    """
+    Persistent index of perceptual hashes of the judged images, used to recognise the same picture under different urls and encodings.
+    Every entry maps the hashes to the content hash of the first seen copy, the time it was added and the topics it was used for.
+    Images that were never used are pruned by age and count, used ones are kept so they are never shown twice.
+    """
+
+    def __init__(self, index_file: str = "./cache/perceptual_hashes.json"):
+        self.index_file = index_file
+        self._lock = threading.RLock()
+        self._dirty = False
+        self.entries: List[Dict[str, Any]] = []
+        self._dhashes = np.zeros(0, dtype=np.uint64)
+        self._ahashes = np.zeros(0, dtype=np.uint64)
+        self._added_hashes: List[Tuple[int, int]] = []  # (dHash, aHash) of the entries added since the arrays were last built
+        self._staged: Dict[str, List[Dict[str, Any]]] = {}  # topic -> entries picked for its episode, not published yet
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, "r") as json_file:
+                self.entries = json.load(json_file)
+        except (json.JSONDecodeError, OSError) as e:
+            logging.error(f"Could not load perceptual hash index, starting empty: {e}")
+            self.entries = []
+            return
+        now = time.time()
+        for entry in self.entries:
+            entry.setdefault("added_at", now)  # entries written before pruning existed start their lifetime now
+        self._prune()
+        self._rebuild_arrays()
+
+    def _rebuild_arrays(self) -> None:
+        self._dhashes = np.array([int(entry["dhash"], 16) for entry in self.entries], dtype=np.uint64)
+        self._ahashes = np.array([int(entry["ahash"], 16) for entry in self.entries], dtype=np.uint64)
+        self._added_hashes = []
+
+    def _prune(self) -> None:
+        """Drops the entries never used in an episode that expired or exceed MAX_UNUSED_ENTRIES, staged ones are kept until their episode is decided."""
+        staged = {id(entry) for entries in self._staged.values() for entry in entries}
+        now = time.time()
+        unused = [entry for entry in self.entries if not entry["used_in"] and id(entry) not in staged]
+        expired = {id(entry) for entry in unused if now - entry["added_at"] >= UNUSED_ENTRY_TTL}
+        unused = [entry for entry in unused if id(entry) not in expired]
+        if len(unused) > MAX_UNUSED_ENTRIES:
+            expired.update(id(entry) for entry in sorted(unused, key=lambda entry: entry["added_at"])[: len(unused) - MAX_UNUSED_ENTRIES])
+        if expired:
+            self.entries = [entry for entry in self.entries if id(entry) not in expired]
+            self._rebuild_arrays()
+            self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            self._prune()
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            tmp_file = self.index_file + ".tmp"
+            with open(tmp_file, "w") as json_file:
+                json.dump(self.entries, json_file)
+            os.replace(tmp_file, self.index_file)
+            self._dirty = False
+
+    def find(self, dhash: int, ahash: int) -> Optional[Dict[str, Any]]:
+        """Returns the closest near-duplicate entry, None if the image was not seen before."""
+        with self._lock:
+            if not self.entries:
+                return None
+            if self._added_hashes:  # grown once per lookup instead of copying the arrays on every add
+                added = np.array(self._added_hashes, dtype=np.uint64)
+                self._dhashes = np.concatenate([self._dhashes, added[:, 0]])
+                self._ahashes = np.concatenate([self._ahashes, added[:, 1]])
+                self._added_hashes = []
+            dhash_distances = hamming_distances(self._dhashes, dhash)
+            ahash_distances = hamming_distances(self._ahashes, ahash)
+            candidates = np.flatnonzero((dhash_distances <= MAX_DHASH_DISTANCE) & (ahash_distances <= MAX_AHASH_DISTANCE))
+            if candidates.size == 0:
+                return None
+            return self.entries[int(candidates[np.argmin(dhash_distances[candidates])])]
+
+    def add(self, dhash: int, ahash: int, image_hash: str) -> Dict[str, Any]:
+        with self._lock:
+            entry: Dict[str, Any] = {"dhash": f"{dhash:016x}", "ahash": f"{ahash:016x}", "image_hash": image_hash, "added_at": time.time(), "used_in": []}
+            self.entries.append(entry)
+            self._added_hashes.append((dhash, ahash))
+            self._dirty = True
+            return entry
+
+    def stage_use(self, entry: Dict[str, Any], topic: str) -> None:
+        """Remembers that the image was picked for an episode about the topic, it only counts as used once commit_uses() is called on publishing."""
+        with self._lock:
+            self._staged.setdefault(topic, []).append(entry)
+
+    def commit_uses(self, topic: str) -> None:
+        """The episode about the topic was published, its staged images are not offered to other topics anymore."""
+        with self._lock:
+            for entry in self._staged.pop(topic, []):
+                self.mark_used(entry, topic)
+        self.save()
+
+    def discard_uses(self, topic: str) -> None:
+        """The episode about the topic was discarded, its staged images stay free for other topics."""
+        with self._lock:
+            self._staged.pop(topic, None)
+
+    def mark_used(self, entry: Dict[str, Any], topic: str) -> None:
+        """Remembers that the image is shown in an episode about the topic."""
+        with self._lock:
+            if topic not in entry["used_in"]:
+                entry["used_in"].append(topic)
+                self._dirty = True
+
+
+_perceptual_hash_index: Optional[PerceptualHashIndex] = None
+_perceptual_hash_index_lock = threading.Lock()
+
+
+def get_perceptual_hash_index() -> PerceptualHashIndex:
+    """Index shared by all scrapers of the process, loaded on first use so importing this module reads no files."""
+    global _perceptual_hash_index
+    with _perceptual_hash_index_lock:
+        if _perceptual_hash_index is None:
+            _perceptual_hash_index = PerceptualHashIndex()
+        return _perceptual_hash_index
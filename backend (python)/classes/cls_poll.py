@@ -1,9 +1,23 @@
 import json
 import os
 import random
-from typing import Dict, List, Union
+import re
+from typing import Any, Dict, List, Optional, Union
 
-from classes.struct_Episode import struct_Episode
+from classes.cls_episode_meta import EpisodeMeta
+
+POLL_FILE = "./cache/poll_votes.json"
+MAX_VOTE_LENGTH = 16  # longer messages are chat, not votes
+VOTE_PATTERN = re.compile(r"^(?:vote|option)?\s*[:#]?\s*\(?([a-z])\)?[\s.!]*$", re.IGNORECASE)  # "A", "b!", "vote A", "Vote: (c)"
+
+
+def parse_vote(message: str) -> Optional[str]:
+    """Returns the upper case option letter a chat message votes for, None if it is no vote."""
+    message = message.strip()
+    if len(message) > MAX_VOTE_LENGTH:
+        return None
+    match = VOTE_PATTERN.match(message)
+    return match.group(1).upper() if match else None
 
 
 class PollOption:
@@ -24,6 +38,38 @@ class PollOption:
         )
 
 
+class VoteAggregator:
+    """
+    Tallies the chat votes of a poll into its options with constant cost per message.
+    Every author has one vote per poll, voting again moves it to the new option. Messages without an author are counted each.
+    """
+
+    def __init__(self, options: List[PollOption], votes_by_author: Optional[Dict[str, str]] = None) -> None:
+        self.options: Dict[str, PollOption] = {option.letter: option for option in options}
+        self.votes_by_author: Dict[str, str] = votes_by_author or {}
+        self.total: int = sum(option.votes for option in options)
+
+    def add(self, author: str, message: str) -> bool:
+        """Counts the message if it is a vote for an option, returns whether the tally changed."""
+        letter = parse_vote(message)
+        if letter not in self.options:
+            return False
+        previous = self.votes_by_author.get(author) if author else None
+        if previous == letter:
+            return False
+        if previous in self.options:
+            self.options[previous].votes -= 1
+        else:
+            self.total += 1
+        self.options[letter].votes += 1
+        if author:
+            self.votes_by_author[author] = letter
+        return True
+
+    def percentage(self, letter: str) -> float:
+        return round(100 * self.options[letter].votes / self.total, 1) if self.total else 0.0
+
+
 class Poll:
     def __init__(self, next_episode_options: List[str] = []) -> None:
         self.pollOptions: List[PollOption] = []
@@ -32,31 +78,42 @@ class Poll:
             self.pollOptions.append(PollOption(letter="A", votes=0, episode_title=self.get_title(chosen_episode_options[0])))
             self.pollOptions.append(PollOption(letter="B", votes=0, episode_title=self.get_title(chosen_episode_options[1])))
             self.pollOptions.append(PollOption(letter="C", votes=0, episode_title=self.get_title(chosen_episode_options[2])))
+        self.aggregator = VoteAggregator(self.pollOptions)
     
     def get_title(self, episode_folder_path:str):
-        with open(episode_folder_path + "/actions.json", "r") as file:
-            episode_data = file.read()
-        episode: struct_Episode = struct_Episode.from_json(episode_data)
-        return episode.episode_title
+        return EpisodeMeta.load(episode_folder_path).episode_title
         
         
-    def to_json(self) -> str:
-        poll_options_list: List[Dict[str, Union[str, int]]] = [option.to_dict() for option in self.pollOptions]
-        return json.dumps({"pollOptions": poll_options_list}, indent=4)
+    def to_json(self, include_voters: bool = False) -> str:
+        """:param include_voters: Adds who voted for what, needed to restore the one-vote-per-author rule from a file."""
+        poll_options_list: List[Dict[str, Union[str, int, float]]] = [
+            {**option.to_dict(), "percentage": self.aggregator.percentage(option.letter)} for option in self.pollOptions
+        ]
+        data: Dict[str, Any] = {"pollOptions": poll_options_list, "totalVotes": self.aggregator.total}
+        if include_voters:
+            data["voters"] = self.aggregator.votes_by_author
+        return json.dumps(data, indent=4)
 
-    def update_votes(self, message: str) -> None:
-        for option in self.pollOptions:
-            if message == option.letter:
-                option.votes += 1
+    def update_votes(self, message: str, author: str = "") -> bool:
+        """Counts the message as a vote if it names an option, returns whether the tally changed."""
+        return self.aggregator.add(author, message)
+
+    @staticmethod
+    def write_json(poll_json: str, file_path: str = POLL_FILE) -> None:
+        """Replaces the poll file atomically, readers never see a half written poll."""
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write(poll_json)
+        os.replace(tmp_path, file_path)
 
-    def to_file(self) -> None:
-        with open("./cache/poll_votes.json", 'w') as file:
-            file.write(self.to_json())
+    def to_file(self, file_path: str = POLL_FILE) -> None:
+        self.write_json(self.to_json(include_voters=True), file_path)
 
     @classmethod
-    def from_file(cls) -> 'Poll':
-        with open("./cache/poll_votes.json", 'r') as file:
+    def from_file(cls, file_path: str = POLL_FILE) -> 'Poll':
+        with open(file_path, 'r') as file:
             data = json.load(file)
             poll = cls()
             poll.pollOptions = [PollOption.from_dict(option) for option in data["pollOptions"]]
+            poll.aggregator = VoteAggregator(poll.pollOptions, data.get("voters", {}))
             return poll
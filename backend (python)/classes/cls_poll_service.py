@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import threading
+from typing import Iterable, List, Optional
+
+from classes.cls_metrics import metrics_registry
+from classes.cls_poll import POLL_FILE, Poll
+from interface.cls_livestream_message import LivestreamMessage
+
+SNAPSHOT_INTERVAL = 10  # seconds between snapshots of a changed poll
+
+CHAT_MESSAGES = metrics_registry.counter("llm_classroom_poll_messages_total", "Chat messages received by the poll")
+POLL_VOTES = metrics_registry.counter("llm_classroom_poll_votes_total", "Chat messages that changed the poll tally")
+
+logger = logging.getLogger(__name__)
+
+
+class PollService:
+    """
+    Owns the audience poll of the REST API process. Votes are counted in memory and reads are answered from it,
+    the poll file is only written by a background snapshot (atomically) so a restart resumes with the last counts.
+    """
+
+    def __init__(self, snapshot_file: str = POLL_FILE, snapshot_interval: float = SNAPSHOT_INTERVAL):
+        self.snapshot_file = snapshot_file
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.poll = self._load()
+
+    def _load(self) -> Poll:
+        if not os.path.exists(self.snapshot_file):
+            return Poll()
+        try:
+            return Poll.from_file(self.snapshot_file)
+        except (json.JSONDecodeError, OSError, KeyError, TypeError, ValueError) as e:
+            logger.error(f"Could not load the poll snapshot, starting with an empty poll: {e}")
+            return Poll()
+
+    def start(self) -> None:
+        """Starts the background snapshots, safe to call more than once."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._snapshot_loop, name="poll-snapshots", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.snapshot()
+
+    def _snapshot_loop(self) -> None:
+        while not self._stop.wait(self.snapshot_interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                logger.error(f"Could not snapshot the poll: {e}")
+
+    def snapshot(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            poll_json = self.poll.to_json(include_voters=True)
+            self._dirty = False
+        Poll.write_json(poll_json, self.snapshot_file)
+
+    def reset(self, next_episode_options: List[str]) -> Poll:
+        poll = Poll(next_episode_options)
+        with self._lock:
+            self.poll = poll
+            self._dirty = True
+        self.snapshot()  # a new poll is rare, persist it right away
+        return poll
+
+    def add_votes(self, messages: Iterable[LivestreamMessage]) -> None:
+        message_count = vote_count = 0
+        with self._lock:
+            for message in messages:
+                message_count += 1
+                if self.poll.update_votes(message.message, message.author):
+                    vote_count += 1
+            self._dirty |= vote_count > 0
+        CHAT_MESSAGES.inc(message_count)
+        POLL_VOTES.inc(vote_count)
+
+    def to_json(self) -> str:
+        with self._lock:
+            return self.poll.to_json()
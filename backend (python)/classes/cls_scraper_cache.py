@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Time to live of the cache entries in seconds
+URL_FAILURE_TTL = 24 * 60 * 60  # Broken hosts are retried after a day
+URL_TTL = 14 * 24 * 60 * 60
+DESCRIPTION_TTL = 30 * 24 * 60 * 60
+VERDICT_TTL = 30 * 24 * 60 * 60
+MAX_URL_ENTRIES = 50_000  # Beyond this the oldest url results are forgotten, they are the cheapest to redo
+
+
+def hash_image_bytes(image_data: bytes) -> str:
+    """Content hash used to identify an image independent of the url it was found under."""
+    return hashlib.sha256(image_data).hexdigest()
+
+
+class ScraperCache:
+    """
+    On-disk cache of the web scraper's work, shared between searches and episodes.
+    urls:   url -> {"status": "ok" | "failed" | "rejected", "image_hash", "width", "height", "timestamp"}
+    images: image_hash -> {"description", "described_at", "verdicts": {topic: {"fits", "timestamp"}}}
+    """
+
+    def __init__(self, cache_file: str = "./cache/scraper_cache.json"):
+        self.cache_file = cache_file
+        self._lock = threading.RLock()
+        self._dirty = False
+        self.urls: Dict[str, Dict[str, Any]] = {}
+        self.images: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        """Load the cache from disk, dropping expired entries."""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r") as json_file:
+                data = json.load(json_file)
+        except (json.JSONDecodeError, OSError) as e:
+            logging.error(f"Could not load scraper cache, starting empty: {e}")
+            return
+        self.urls = data.get("urls", {})
+        self.images = data.get("images", {})
+        self._prune()
+
+    def _prune(self) -> None:
+        """Drops expired entries and the oldest url results beyond MAX_URL_ENTRIES, so a long running generator doesn't grow the cache without bound."""
+        self.urls = {url: entry for url, entry in self.urls.items() if self._url_is_fresh(entry)}
+        if len(self.urls) > MAX_URL_ENTRIES:
+            newest = sorted(self.urls.items(), key=lambda item: item[1]["timestamp"])[-MAX_URL_ENTRIES:]
+            self.urls = dict(newest)
+        for image in self.images.values():
+            image["verdicts"] = {topic: verdict for topic, verdict in image.get("verdicts", {}).items() if self._is_fresh(verdict["timestamp"], VERDICT_TTL)}
+        self.images = {
+            image_hash: image for image_hash, image in self.images.items() if image["verdicts"] or (image.get("description") and self._is_fresh(image["described_at"], DESCRIPTION_TTL))
+        }
+
+    def save(self) -> None:
+        """Write the cache to disk if it changed, the file is replaced atomically so a crash never leaves a torn cache behind."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._prune()
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, "w") as json_file:
+                json.dump({"urls": self.urls, "images": self.images}, json_file)
+            os.replace(tmp_file, self.cache_file)
+            self._dirty = False
+
+    @staticmethod
+    def _is_fresh(timestamp: float, ttl: float) -> bool:
+        return time.time() - timestamp < ttl
+
+    def _url_is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return self._is_fresh(entry["timestamp"], URL_FAILURE_TTL if entry["status"] == "failed" else URL_TTL)
+
+    def get_url(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self.urls.get(url)
+            if entry and self._url_is_fresh(entry):
+                return entry
+            return None
+
+    def record_url(self, url: str, status: str, image_hash: str = "", width: int = 0, height: int = 0) -> None:
+        with self._lock:
+            self.urls[url] = {"status": status, "image_hash": image_hash, "width": width, "height": height, "timestamp": time.time()}
+            self._dirty = True
+
+    def get_description(self, image_hash: str) -> Optional[str]:
+        with self._lock:
+            image = self.images.get(image_hash)
+            if image and image.get("description") and self._is_fresh(image["described_at"], DESCRIPTION_TTL):
+                return image["description"]
+            return None
+
+    def record_description(self, image_hash: str, description: str) -> None:
+        with self._lock:
+            image = self.images.setdefault(image_hash, {"verdicts": {}})
+            image["description"] = description
+            image["described_at"] = time.time()
+            self._dirty = True
+
+    def get_verdict(self, image_hash: str, topic: str) -> Optional[bool]:
+        """Returns whether the image was judged to fit the topic, None if it was not judged yet."""
+        with self._lock:
+            verdict = self.images.get(image_hash, {}).get("verdicts", {}).get(topic)
+            if verdict and self._is_fresh(verdict["timestamp"], VERDICT_TTL):
+                return bool(verdict["fits"])
+            return None
+
+    def record_verdict(self, image_hash: str, topic: str, fits: bool) -> None:
+        with self._lock:
+            image = self.images.setdefault(image_hash, {"verdicts": {}})
+            image["verdicts"][topic] = {"fits": fits, "timestamp": time.time()}
+            self._dirty = True
+
+
+_scraper_cache: Optional[ScraperCache] = None
+_scraper_cache_lock = threading.Lock()
+
+
+def get_scraper_cache() -> ScraperCache:
+    """Cache shared by all scrapers of the process, loaded on first use so importing this module reads no files."""
+    global _scraper_cache
+    with _scraper_cache_lock:
+        if _scraper_cache is None:
+            _scraper_cache = ScraperCache()
+        return _scraper_cache
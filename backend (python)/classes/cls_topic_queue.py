@@ -0,0 +1,90 @@
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+TOPIC_QUEUE_FILE = "./cache/shared/topic_queue.json"
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_title(title: str) -> str:
+    """Comparable form of an episode title or topic: lower case, no punctuation, single spaces, without a leading article."""
+    title = re.sub(r"[^\w\s]", " ", title.lower())
+    title = " ".join(title.split())
+    return re.sub(r"^(the|a|an) ", "", title)
+
+
+class TopicQueue:
+    """
+    Persistent priority queue of the episode topics requested by the chat, consumed by the episode generator.
+    The most requested topic comes first, ties go to the oldest request. Requesting a queued topic again raises its priority.
+    Also remembers how far the chat log was processed, so no message is turned into topics twice.
+    """
+
+    def __init__(self, queue_file: str = TOPIC_QUEUE_FILE):
+        self.queue_file = queue_file
+        self._lock = threading.Lock()
+        self.topics: Dict[str, Dict[str, Any]] = {}  # normalized title -> {"title", "priority", "requested_at"}
+        self._heap: List[Tuple[int, float, str]] = []  # (-priority, requested_at, normalized title), outdated priorities are skipped on pop
+        self.chat_offset: Optional[int] = None  # byte offset into the chat log, None until the first run starts it at the log's end
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.queue_file):
+            return
+        try:
+            with open(self.queue_file, "r") as json_file:
+                data = json.load(json_file)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Could not load the topic queue, starting empty: {e}")
+            return
+        self.chat_offset = data.get("chat_offset")
+        for topic in data.get("topics", []):
+            key = normalize_title(topic["title"])
+            self.topics[key] = topic
+            self._heap.append((-topic["priority"], topic["requested_at"], key))
+        heapq.heapify(self._heap)
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"chat_offset": self.chat_offset, "topics": list(self.topics.values())}
+        os.makedirs(os.path.dirname(self.queue_file), exist_ok=True)
+        tmp_file = self.queue_file + ".tmp"
+        with open(tmp_file, "w") as json_file:
+            json.dump(data, json_file, indent=4)
+        os.replace(tmp_file, self.queue_file)
+
+    def __contains__(self, title: str) -> bool:
+        return normalize_title(title) in self.topics
+
+    def __len__(self) -> int:
+        return len(self.topics)
+
+    def push(self, title: str) -> None:
+        """Queues the topic, or raises its priority if it is queued already."""
+        key = normalize_title(title)
+        if not key:
+            return
+        with self._lock:
+            topic = self.topics.get(key)
+            if topic:
+                topic["priority"] += 1
+            else:
+                topic = self.topics[key] = {"title": title.strip(), "priority": 1, "requested_at": time.time()}
+            heapq.heappush(self._heap, (-topic["priority"], topic["requested_at"], key))
+
+    def pop(self) -> Optional[str]:
+        """Removes and returns the most requested topic, None if the queue is empty."""
+        with self._lock:
+            while self._heap:
+                negative_priority, _, key = heapq.heappop(self._heap)
+                topic = self.topics.get(key)
+                if topic and topic["priority"] == -negative_priority:
+                    del self.topics[key]
+                    return topic["title"]
+            return None
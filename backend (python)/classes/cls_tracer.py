@@ -0,0 +1,130 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+TRACE_FILE = "./cache/logs/episode_trace.jsonl"
+SUMMARY_WINDOW = 500  # latest spans per stage the percentiles are computed from
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_span", default=None)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of the values, q between 0 and 1."""
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class Tracer:
+    """
+    Times the stages of the episode generation as nested spans, every finished span is appended to a JSON Lines trace file.
+    Spans of one episode share a trace_id and point to their parent, LLM calls also carry Ollama's token counts.
+    Recent durations are kept per stage for the p50/p95 summary.
+    """
+
+    def __init__(self, trace_file: str = TRACE_FILE):
+        self.trace_file = trace_file
+        self._lock = threading.Lock()
+        self.durations: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=SUMMARY_WINDOW))
+        self.tokens: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "prompt_eval_count": 0, "eval_count": 0})
+
+    @contextmanager
+    def span(self, name: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+        """Times the enclosed block, fields added to the yielded span end up in the trace."""
+        parent = _current_span.get()
+        span: Dict[str, Any] = {
+            "name": name,
+            "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex[:16],
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent["span_id"] if parent else None,
+            "start": time.time(),
+            **fields,
+        }
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span["error"] = repr(e)
+            raise
+        finally:
+            span["duration"] = time.perf_counter() - start
+            _current_span.reset(token)
+            self._record(span)
+
+    def annotate(self, **fields: Any) -> None:
+        """Adds fields to the innermost running span, does nothing outside of spans."""
+        span = _current_span.get()
+        if span is not None:
+            span.update(fields)
+
+    def record_tokens(self, model: str, ollama_response: Dict[str, Any]) -> None:
+        """Takes the token counts of a finished Ollama generate response into the current span and the per model totals."""
+        prompt_eval_count = ollama_response.get("prompt_eval_count", 0)
+        eval_count = ollama_response.get("eval_count", 0)
+        eval_duration = ollama_response.get("eval_duration", 0)  # nanoseconds
+        self.annotate(
+            model=model,
+            prompt_eval_count=prompt_eval_count,
+            eval_count=eval_count,
+            tokens_per_second=round(eval_count / (eval_duration / 1e9), 1) if eval_duration else None,
+        )
+        with self._lock:
+            totals = self.tokens[model]
+            totals["calls"] += 1
+            totals["prompt_eval_count"] += prompt_eval_count
+            totals["eval_count"] += eval_count
+
+    def _record(self, span: Dict[str, Any]) -> None:
+        line = json.dumps(span, default=str) + "\n"
+        with self._lock:
+            self.durations[span["name"]].append(span["duration"])
+            try:
+                os.makedirs(os.path.dirname(self.trace_file), exist_ok=True)
+                with open(self.trace_file, "a") as file:
+                    file.write(line)
+            except OSError as e:
+                logger.error(f"Could not write trace: {e}")
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """count, p50, p95 and total seconds of the recent spans of every stage."""
+        with self._lock:
+            return {
+                name: {"count": len(durations), "p50": percentile(list(durations), 0.5), "p95": percentile(list(durations), 0.95), "total": sum(durations)}
+                for name, durations in self.durations.items()
+                if durations
+            }
+
+    def log_summary(self) -> None:
+        """Logs the stage durations and token counts at DEBUG, the trace file holds every span anyway."""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        for name, stats in sorted(self.summary().items(), key=lambda item: -item[1]["total"]):
+            logger.debug(f"{name}: {stats['count']:.0f}x  p50 {stats['p50']:.1f}s  p95 {stats['p95']:.1f}s  total {stats['total']:.0f}s")
+        with self._lock:
+            tokens = {model: dict(totals) for model, totals in self.tokens.items()}
+        for model, totals in tokens.items():
+            logger.debug(f"{model}: {totals['calls']} calls, {totals['prompt_eval_count']} prompt tokens, {totals['eval_count']} generated tokens")
+
+
+tracer = Tracer()
+
+
+def traced(func: Callable) -> Callable:
+    """Runs every call of the function in a span named after its qualified name."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with tracer.span(func.__qualname__):
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -1,30 +1,84 @@
 import base64
 import logging
 import random
+import threading
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from io import BytesIO
-from typing import Callable, List, Optional
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
 from urllib.parse import urljoin, urlparse
 
 import requests
 from bs4 import BeautifulSoup
 from duckduckgo_search import ddg
 from PIL import Image
+from requests.adapters import HTTPAdapter
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from classes.cls_perceptual_hash import PerceptualHashIndex, get_perceptual_hash_index, perceptual_hashes
+from classes.cls_scraper_cache import ScraperCache, get_scraper_cache, hash_image_bytes
+from classes.cls_tracer import traced
 
-def validate_base64_image(base64_string: str) -> bool:
-    """Validates if a base64 encoded string is a valid non-GIF image with a minimum size of 250px by 250px."""
+MIN_IMAGE_SIDE = 250  # Images with a smaller width or height are never considered
+MIN_IMAGE_BYTES = 4 * 1024  # Anything smaller is an icon, a spacer or a placeholder
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+HEADER_PROBE_BYTES = 64 * 1024  # Enough to read the dimensions of all common image formats
+IGNORED_IMAGE_EXTENSIONS = (".svg", ".gif", ".ico")
+IGNORED_CONTENT_TYPES = ("image/gif", "image/svg+xml", "image/x-icon", "image/vnd.microsoft.icon")
+
+def validate_image_bytes(image_data: bytes) -> bool:
+    """Validates if the raw bytes are a valid non-GIF image with a minimum size of 250px by 250px."""
     try:
-        image_data = base64.b64decode(base64_string)
         image = Image.open(BytesIO(image_data))
         image.verify()
-        # Update minimum size check to 250px by 250px
-        return image.format != "GIF" and min(image.size) >= 250
+        return image.format != "GIF" and min(image.size) >= MIN_IMAGE_SIDE
     except Exception as e:
         logging.error(f"Image validation failed: {e}")
         return False
 
+def validate_base64_image(base64_string: str) -> bool:
+    """Validates if a base64 encoded string is a valid non-GIF image with a minimum size of 250px by 250px."""
+    return validate_image_bytes(base64.b64decode(base64_string))
+
+def probe_image_header(header_bytes: bytes) -> Optional[Tuple[str, Tuple[int, int]]]:
+    """Reads format and size from the first bytes of an image without decoding any pixels, returns None if the header could not be parsed."""
+    try:
+        image = Image.open(BytesIO(header_bytes))
+        return image.format or "", image.size
+    except Exception:
+        return None
+
+def parse_srcset(srcset: str) -> List[Tuple[str, int]]:
+    """Splits a srcset attribute into (url, width) pairs, density descriptors like '2x' are ranked by their factor and missing descriptors count as 0."""
+    candidates: List[Tuple[str, int]] = []
+    for piece in srcset.split(","):
+        parts = piece.strip().split()
+        if not parts:
+            continue
+        descriptor = parts[1] if len(parts) > 1 else ""
+        try:
+            if descriptor.endswith("w"):
+                width = int(descriptor[:-1])
+            elif descriptor.endswith("x"):
+                width = int(float(descriptor[:-1]))
+            else:
+                width = 0
+        except ValueError:
+            width = 0
+        candidates.append((parts[0], width))
+    return candidates
+
+def declared_image_width(tag) -> Optional[int]:
+    """
+    Returns the largest intrinsic width the srcset of an <img> tag declares, None if it declares none.
+    The width attribute is left out, it is the display size and says nothing about the resolution of the file behind a thumbnail.
+    """
+    widths: List[int] = []
+    for attribute in ("data-srcset", "srcset"):
+        if tag.get(attribute):
+            widths += [width for _, width in parse_srcset(tag.get(attribute)) if width > 10]  # skip density descriptors
+    return max(widths) if widths else None
+
 def correct_url_scheme(url: str) -> str:
     """Ensures the URL has a valid https scheme if it lacks one."""
     parsed = urlparse(url)
@@ -34,45 +88,124 @@ def correct_url_scheme(url: str) -> str:
 
 class WebScraper:
     """Web scraper for fetching high quality images from search results."""
-    def __init__(self, search_keyword: str):
+    def __init__(self, search_keyword: str, topic: str = "", max_workers: int = 16, max_connections_per_host: int = 2, deadline_seconds: float = 300):
+        """
+        :param topic: Topic the images are judged against, cached verdicts are looked up per topic. Defaults to the search keyword.
+        :param max_workers: Number of pages and images downloaded in parallel.
+        :param max_connections_per_host: Upper bound of simultaneous requests against a single host.
+        :param deadline_seconds: Overall time budget for get_images_as_base64, across all retries.
+        """
         self.search_keyword = search_keyword
+        self.topic = topic or search_keyword
+        self.cache: ScraperCache = get_scraper_cache()
+        self.perceptual_hash_index: PerceptualHashIndex = get_perceptual_hash_index()
         self.user_agents = [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3",
         ]
         self.urls: List[str] = []
         self.processed_urls:set = set()
-        self.url_ignore_list:list = []
+        self.url_ignore_list:set = set()
         self.max_retries = 100
         self.retry_sleep = 1
+        self.max_workers = max_workers
+        self.max_connections_per_host = max_connections_per_host
+        self.deadline_seconds = deadline_seconds
+
+        # One pooled session shared by all worker threads, sized so every worker can keep its connection alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+    def _claim_url(self, url: str) -> bool:
+        """Marks the url as processed, returns False if it was already processed, is ignored or is known to be useless from a previous search."""
+        with self._lock:
+            if url in self.url_ignore_list or url in self.processed_urls:
+                return False
+            self.processed_urls.add(url)
+        cached = self.cache.get_url(url)
+        if cached and cached["status"] in ("failed", "rejected"):
+            return False
+        if cached and cached["image_hash"] and self.cache.get_verdict(cached["image_hash"], self.topic) is False:
+            return False
+        return True
+
+    def _ignore_url(self, url: str, status: str = "failed") -> None:
+        with self._lock:
+            self.url_ignore_list.add(url)
+        self.cache.record_url(url, status)
+
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+            return self._host_semaphores[host]
+
+    def _get(self, url: str) -> requests.Response:
+        headers = {"User-Agent": random.choice(self.user_agents)}
+        with self._host_semaphore(url):
+            response = self.session.get(url, headers=headers, timeout=5)
+        response.raise_for_status()
+        return response
+
+    def _read_prefiltered_image(self, response: requests.Response) -> Optional[bytes]:
+        """Reads the image body, bailing out on headers or an image header that disqualify it before the full download."""
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type and (not content_type.startswith("image/") or content_type in IGNORED_CONTENT_TYPES):
+            logging.info(f"Skipping image with content type: {content_type}")
+            return None
+        content_length = response.headers.get("Content-Length", "")
+        if content_length.isdigit() and not MIN_IMAGE_BYTES <= int(content_length) <= MAX_IMAGE_BYTES:
+            logging.info(f"Skipping image with content length: {content_length}")
+            return None
+
+        image_data = bytearray()
+        probed = False
+        for chunk in response.iter_content(chunk_size=16 * 1024):
+            image_data += chunk
+            if len(image_data) > MAX_IMAGE_BYTES:
+                return None
+            if not probed:
+                header = probe_image_header(bytes(image_data))
+                probed = header is not None or len(image_data) >= HEADER_PROBE_BYTES
+                if header and (header[0] == "GIF" or min(header[1]) < MIN_IMAGE_SIDE):
+                    logging.info(f"Skipping {header[0]} image of size {header[1]}")
+                    return None
+        if len(image_data) < MIN_IMAGE_BYTES:
+            return None
+        return bytes(image_data)
 
     def fetch_url_content(self, url: str) -> Optional[str]:
         corrected_url = correct_url_scheme(url)
-        if corrected_url in self.url_ignore_list or corrected_url in self.processed_urls:
+        if not self._claim_url(corrected_url):
             return None
-        self.processed_urls.add(corrected_url)
-        headers = {"User-Agent": random.choice(self.user_agents)}
         try:
-            response = requests.get(corrected_url, headers=headers, timeout=5)
-            response.raise_for_status()
-            return response.text
+            return self._get(corrected_url).text
         except requests.RequestException as e:
-            self.url_ignore_list.append(corrected_url)
+            self._ignore_url(corrected_url)
             logging.error(f"Failed to fetch URL content: {e} for URL: {corrected_url}")
             return None
 
     def fetch_image(self, url: str) -> Optional[bytes]:
         corrected_url = correct_url_scheme(url)
-        if corrected_url in self.url_ignore_list or corrected_url in self.processed_urls:
+        if not self._claim_url(corrected_url):
             return None
-        self.processed_urls.add(corrected_url)
         headers = {"User-Agent": random.choice(self.user_agents)}
         try:
-            response = requests.get(corrected_url, headers=headers, timeout=5)
-            response.raise_for_status()
+            with self._host_semaphore(corrected_url):
+                with self.session.get(corrected_url, headers=headers, timeout=5, stream=True) as response:
+                    response.raise_for_status()
+                    image_data = self._read_prefiltered_image(response)
+            if not image_data:
+                self._ignore_url(corrected_url, "rejected")
+                return None
             logging.info(f"Downloaded image from: {corrected_url}")
-            return response.content
+            return image_data
         except requests.RequestException as e:
-            self.url_ignore_list.append(corrected_url)
+            self._ignore_url(corrected_url)
             logging.error(f"Failed to fetch image: {e} for URL: {corrected_url}")
             return None
 
@@ -84,47 +217,152 @@ class WebScraper:
             logging.error(f"DuckDuckGo search failed: {e}")
             return []
 
-    def process_page_for_image(self, page_content: str, process_image: Callable[[str], bool]) -> Optional[str]:
+    def extract_image_urls(self, page_content: str) -> List[str]:
+        """Returns the shuffled candidate image urls of a page."""
         soup = BeautifulSoup(page_content, "html.parser")
         image_tags = soup.find_all("img", src=True)
         random.shuffle(image_tags)
+        base_url = soup.base.get('href') if soup.base else ""
+        image_urls: List[str] = []
         for tag in image_tags:
-            image_url = self.get_high_quality_image_url(tag, soup.base.get('href') if soup.base else "")
-            if image_url and (not image_url.endswith(".svg")):
-                image_content = self.fetch_image(image_url)
-                if image_content:
-                    base64_encoded = base64.b64encode(image_content).decode()
-                    if validate_base64_image(base64_encoded) and process_image(base64_encoded):
-                        return base64_encoded
+            declared_width = declared_image_width(tag)
+            if declared_width is not None and declared_width < MIN_IMAGE_SIDE:
+                continue
+            image_url = self.get_high_quality_image_url(tag, base_url)
+            if image_url and not urlparse(image_url).path.lower().endswith(IGNORED_IMAGE_EXTENSIONS):
+                image_urls.append(image_url)
+        return image_urls
+
+    def _evaluate_image(self, image_url: str, image_content: bytes, process_image: Callable[[str], bool]) -> Optional[str]:
+        """Validates a downloaded image and asks process_image whether it fits, verdicts are cached per image content and topic and shared between near-duplicates."""
+        corrected_url = correct_url_scheme(image_url)
+        if not validate_image_bytes(image_content):
+            self.cache.record_url(corrected_url, "rejected")
+            return None
+        try:
+            dhash, ahash = perceptual_hashes(image_content)
+        except Exception as e:  # verify() doesn't decode the pixels, truncated or corrupt images only fail here
+            logging.error(f"Image decoding failed: {e} for URL: {corrected_url}")
+            self.cache.record_url(corrected_url, "rejected")
+            return None
+        image_hash = hash_image_bytes(image_content)
+        header = probe_image_header(image_content)
+        width, height = header[1] if header else (0, 0)
+        self.cache.record_url(corrected_url, "ok", image_hash, width, height)
+
+        duplicate = self.perceptual_hash_index.find(dhash, ahash)
+        if duplicate and [topic for topic in duplicate["used_in"] if topic != self.topic]:
+            logging.info(f"Skipping image already shown in the episodes {duplicate['used_in']}: {corrected_url}")
+            return None
+        verdict_hashes = list(dict.fromkeys([image_hash, duplicate["image_hash"] if duplicate else image_hash]))  # the image itself and its first seen copy
+
+        base64_encoded = base64.b64encode(image_content).decode()
+        verdicts = [self.cache.get_verdict(verdict_hash, self.topic) for verdict_hash in verdict_hashes]
+        fits = next((verdict for verdict in verdicts if verdict is not None), None)
+        judged = fits is None
+        if judged:
+            fits = process_image(base64_encoded)
+            for verdict_hash in verdict_hashes:
+                self.cache.record_verdict(verdict_hash, self.topic, fits)
+        else:
+            logging.info(f"Reusing cached verdict ({fits}) for image: {corrected_url}")
+        entry = duplicate
+        if entry is None and (judged or fits):  # only judged images are indexed, so near-duplicates can reuse their verdict
+            entry = self.perceptual_hash_index.add(dhash, ahash, image_hash)
+        if fits and entry is not None:
+            self.perceptual_hash_index.stage_use(entry, self.topic)  # committed once the episode is published
+        return base64_encoded if fits else None
+
+    def process_page_for_image(self, page_content: str, process_image: Callable[[str], bool]) -> Optional[str]:
+        for image_url in self.extract_image_urls(page_content):
+            image_content = self.fetch_image(image_url)
+            if image_content:
+                base64_encoded = self._evaluate_image(image_url, image_content, process_image)
+                if base64_encoded:
+                    return base64_encoded
         return None
 
     def get_high_quality_image_url(self, tag, base_url: str) -> Optional[str]:
         # Prioritize high-resolution versions by checking additional attributes
         src = tag.get("data-srcset") or tag.get("data-src") or tag.get("srcset") or tag.get("src")
         # Attempt to select the highest resolution available in srcset if present
-        if src and ',' in src:
-            src = max((piece.strip().split(' ')[0] for piece in src.split(',')), key=lambda x: int(x.split('w')[-1]), default=src)
+        if src and (',' in src or ' ' in src.strip()):
+            src = max(parse_srcset(src), key=lambda candidate: candidate[1], default=(src, 0))[0]
         corrected_url = correct_url_scheme(urljoin(base_url, src))
         return corrected_url
 
+    def _search_round(self, executor: ThreadPoolExecutor, deadline: float, process_image: Callable[[str], bool]) -> Optional[str]:
+        """
+        Downloads the pages of the current search results and their images in parallel, with at most max_workers downloads in flight.
+        The validator is called in the calling thread as soon as an image arrives, nothing more is fetched once an image fits or the deadline passed.
+        """
+        page_urls: Deque[str] = deque(self.urls)
+        queued_image_urls: Deque[str] = deque()
+        page_futures: Set[Future] = set()
+        image_urls: Dict[Future, str] = {}
+        pending: Set[Future] = set()
+
+        def submit_downloads() -> None:
+            while len(pending) < self.max_workers and (queued_image_urls or page_urls):
+                future: Future
+                if queued_image_urls:  # images are one step closer to a result than further pages
+                    image_url = queued_image_urls.popleft()
+                    future = executor.submit(self.fetch_image, image_url)
+                    image_urls[future] = image_url
+                else:
+                    future = executor.submit(self.fetch_url_content, page_urls.popleft())
+                    page_futures.add(future)
+                pending.add(future)
+
+        try:
+            submit_downloads()
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logging.error("Deadline reached while searching for a suitable image.")
+                    return None
+                done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+                for future in done:
+                    content = future.result()
+                    if not content:
+                        continue
+                    if future in page_futures:
+                        queued_image_urls.extend(self.extract_image_urls(content))
+                        continue
+                    base64_encoded = self._evaluate_image(image_urls[future], content, process_image)
+                    if base64_encoded:
+                        return base64_encoded
+                submit_downloads()
+            return None
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @traced
     def get_images_as_base64(self, process_image: Callable[[str], bool]) -> Optional[str]:
         retry_count = 0
-        while retry_count < self.max_retries:
-            if not self.urls:
-                self.urls = self.duckduckgo_search(self.search_keyword)
-                self.urls = [url for url in self.urls if url not in self.url_ignore_list]
-                random.shuffle(self.urls)
-            for url in self.urls:
-                page_content = self.fetch_url_content(url)
-                if page_content:
-                    base64_image = self.process_page_for_image(page_content, process_image)
-                    if base64_image:
-                        return base64_image
-            self.urls = []
-            retry_count += 1
-            time.sleep(self.retry_sleep)
-        logging.error("Max retries reached without finding a suitable image.")
-        return None
+        deadline = time.monotonic() + self.deadline_seconds
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while retry_count < self.max_retries and time.monotonic() < deadline:
+                if not self.urls:
+                    self.urls = self.duckduckgo_search(self.search_keyword)
+                    self.urls = [url for url in self.urls if url not in self.url_ignore_list]
+                    random.shuffle(self.urls)
+                base64_image = self._search_round(executor, deadline, process_image)
+                if base64_image:
+                    return base64_image
+                self.urls = []
+                retry_count += 1
+                time.sleep(self.retry_sleep)
+            logging.error("Max retries or deadline reached without finding a suitable image.")
+            return None
+        finally:
+            # Downloads still running finish in the background, the episode doesn't wait for them
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.cache.save()
+            self.perceptual_hash_index.save()
 
 # Note: The script assumes the existence of a functioning ddg() function for DuckDuckGo searches,
 # which needs to be replaced or mocked if not available in the current environment.
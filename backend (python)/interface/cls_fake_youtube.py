@@ -0,0 +1,80 @@
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+FAKE_BROADCAST_ID = "fake-broadcast"
+FAKE_LIVE_CHAT_ID = "fake-live-chat"
+
+
+class _Request:
+    def __init__(self, response: Dict[str, Any]):
+        self._response = response
+
+    def execute(self) -> Dict[str, Any]:
+        return self._response
+
+
+class _LiveBroadcasts:
+    def __init__(self, youtube: "FakeYouTube"):
+        self.youtube = youtube
+
+    def list(self, part: str = "", mine: bool = True, **kwargs) -> _Request:
+        items = []
+        if self.youtube.live:
+            items.append({"id": FAKE_BROADCAST_ID, "status": {"lifeCycleStatus": "live"}, "snippet": {"liveChatId": FAKE_LIVE_CHAT_ID}})
+        return _Request({"items": items})
+
+
+class _LiveChatMessages:
+    def __init__(self, youtube: "FakeYouTube"):
+        self.youtube = youtube
+
+    def list(self, liveChatId: str, part: str = "", maxResults: int = 500, pageToken: Optional[str] = None, **kwargs) -> _Request:
+        youtube = self.youtube
+        youtube.simulate_chatter()
+        youtube.requests += 1
+        # Page tokens are positions in the chat, without one the API answers with the most recent messages
+        start = int(pageToken) if pageToken else max(len(youtube.messages) - maxResults, 0)
+        items = youtube.messages[start : start + maxResults]
+        return _Request(
+            {
+                "items": items,
+                "nextPageToken": str(start + len(items)),
+                "pollingIntervalMillis": youtube.polling_interval_millis,
+                "pageInfo": {"totalResults": len(youtube.messages) - start, "resultsPerPage": len(items)}  # like the real API, the size of this page,
+            }
+        )
+
+
+class FakeYouTube:
+    """
+    In-memory stand-in for the YouTube Data API client, implementing the liveBroadcasts and liveChatMessages calls the chat processor uses.
+    Lets the chat ingestion run locally without OAuth or quota, messages are added by hand or as random votes at a fixed rate.
+    """
+
+    def __init__(self, polling_interval_millis: int = 2000, chatter_per_second: float = 0.0, live: bool = True):
+        self.polling_interval_millis = polling_interval_millis
+        self.chatter_per_second = chatter_per_second
+        self.live = live
+        self.messages: List[Dict[str, Any]] = []
+        self.requests = 0  # number of liveChatMessages requests, the quota a real client would have spent
+        self._last_chatter = time.time()
+
+    def liveBroadcasts(self) -> _LiveBroadcasts:
+        return _LiveBroadcasts(self)
+
+    def liveChatMessages(self) -> _LiveChatMessages:
+        return _LiveChatMessages(self)
+
+    def add_message(self, author: str, message: str) -> None:
+        self.messages.append(
+            {"id": f"fake-message-{len(self.messages)}", "snippet": {"displayMessage": message}, "authorDetails": {"displayName": author}}
+        )
+
+    def simulate_chatter(self) -> None:
+        """Adds the random votes of the time passed since the last call."""
+        now = time.time()
+        for _ in range(int((now - self._last_chatter) * self.chatter_per_second)):
+            self.add_message(f"viewer{random.randint(1, 500)}", random.choice(["A", "b", "vote C", "hello!", "vote a"]))
+        if self.chatter_per_second:
+            self._last_chatter = now
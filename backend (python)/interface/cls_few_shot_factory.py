@@ -1,9 +1,12 @@
 import json
+import logging
 import os
 import random
 from typing import List, Optional, Tuple
 
 from classes.Action import Action
+from classes.cls_episode_index import get_episode_index
+from classes.cls_tracer import traced
 from classes.DisplayableContent import DisplayableContent
 from classes.Location import Location
 from classes.struct_Episode import struct_Episode
@@ -11,6 +14,8 @@ from interface.cls_chat import Chat, Role
 from interface.cls_livestream_message import LivestreamMessage
 from interface.cls_ollama_client import OllamaClient
 
+logger = logging.getLogger(__name__)
+
 
 class FewShotProvider:
     session = OllamaClient()
@@ -19,31 +24,29 @@ class FewShotProvider:
         raise RuntimeError("StaticClass cannot be instantiated.")
 
     @classmethod
+    @traced
     def get_few_shot_examples(
         self, categorizable_text: str = ""
     ) -> List[struct_Episode]:  # This may be adapted in the future using a fitness function for more likely use of better episodes -> recursive self improvement
         example_episodes_path: str = "./few_shot_examples/episodes/"
-        released_episodes_path: str = "./cache/shared/StreamingAssets/released_episodes/"
-        prioritized_episodes_path: str = "./cache/shared/StreamingAssets/prioritized_episodes/"
-        unreleased_episodes_path: str = "./cache/shared/StreamingAssets/unreleased_episodes/"
 
         example_episode_titles: list[str] = os.listdir(example_episodes_path)
-        released_episode_titles: list[str] = os.listdir(released_episodes_path)
-        prioritized_episode_titles: list[str] = os.listdir(prioritized_episodes_path)
-        unreleased_episode_titles: list[str] = os.listdir(unreleased_episodes_path)
 
         example_episode_paths: list[str] = [os.path.join(example_episodes_path, title) for title in example_episode_titles]
-        released_episode_paths: list[str] = [os.path.join(released_episodes_path, title) for title in released_episode_titles]
-        prioritized_episode_paths: list[str] = [os.path.join(prioritized_episodes_path, title) for title in prioritized_episode_titles]
-        unreleased_episode_paths: list[str] = [os.path.join(unreleased_episodes_path, title) for title in unreleased_episode_titles]
 
-        generated_episode_paths: list[str] = released_episode_paths + prioritized_episode_paths + unreleased_episode_paths
+        episode_index = get_episode_index()
+        generated_episodes = episode_index.list("released", "prioritized", "unreleased")
 
         few_shot_episodes = []
 
         episode_paths: List[str] = example_episode_paths
         if categorizable_text:  # use related episodes as few_shot_examples
-            episodePaths_categories: List[Tuple[str, str]] = [(episode_path, self.few_shot_titleToCategory(os.path.basename(episode_path), "zephyr")) for episode_path in generated_episode_paths]
+            episodePaths_categories: List[Tuple[str, str]] = []
+            for generated_episode in generated_episodes:
+                if not generated_episode.category:  # categories are stored in the index, so every episode is only categorized once
+                    generated_episode.category = self.few_shot_titleToCategory(generated_episode.name, "zephyr")
+                    episode_index.set_category(generated_episode.name, generated_episode.category)
+                episodePaths_categories.append((generated_episode.path, generated_episode.category))
             category: str = self.few_shot_titleToCategory(categorizable_text, "zephyr")
             # related_episodePaths: List[str] = [ep for ep, cat in episodePaths_categories if cat in category] #category specific
             related_episodePaths: List[str] = [ep for ep, cat in episodePaths_categories]  # take in all as examples
@@ -64,9 +67,10 @@ class FewShotProvider:
                 if len(few_shot_episodes) >= random.randint(3, len(episode_paths)):  # randomly use 1-4 examples in the future maybe?
                     return few_shot_episodes
             except Exception as e:
-                print(f"ERROR: An unexpected error occurred - {e}")
+                logger.error(f"Could not load a few-shot example: {e}", extra={"episode_path": episode_path})
 
     @classmethod
+    @traced
     def few_shot_topicToEpisodeOutline(
         self,
         episode_title: str,
@@ -108,6 +112,7 @@ class FewShotProvider:
         return response
 
     @classmethod
+    @traced
     def few_shot_outlineToActions(self, episodeOutline: str, llm: str, temperature: float = 0.8) -> str:
         few_shot_episodes: List[struct_Episode] = self.get_few_shot_examples()
         # def get_instruction():
@@ -132,7 +137,8 @@ class FewShotProvider:
             start_of_actions_json,
             temperature=temperature,
         )
-        print("actions_json_str: " + actions_json_str)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Actions:\n{actions_json_str}", extra={"model": llm})
         return actions_json_str
 
     # @classmethod
@@ -182,6 +188,7 @@ class FewShotProvider:
     #     )
 
     @classmethod
+    @traced
     def few_shot_titleToCategory(self, title: str, llm: str) -> str:
         def get_instruction(title: str) -> str:
             categories: list[str] = [
@@ -263,6 +270,7 @@ class FewShotProvider:
         return title_to_category_response.strip("\n").strip("\n").strip("\n")
 
     @classmethod
+    @traced
     def few_shot_isImageTopicAppropriate(self, topic: str, image_content: str, llm: str) -> str:
         def get_instruction(l_topic: str, l_image_content: str) -> str:
             return f"Does the following text describe an image related related to '{l_topic}'?\n'{l_image_content}'"
@@ -317,6 +325,7 @@ class FewShotProvider:
         return is_topic_appropriate_response
     
     @classmethod
+    @traced
     def few_shot_convertToYesNo(self, convert_to_yes_no: str, llm: str) -> str:
         chat_yes_no: Chat = Chat("You are a a YES or NO converter. Understand the user prompt and convert it to the more fitting sentiment.")
         chat_yes_no.add_message(
@@ -362,6 +371,7 @@ class FewShotProvider:
         
 
     @classmethod
+    @traced
     def few_shot_generateBlackboardCaption(cls, topic: str, image_title: str, llm: str) -> str:
         def get_instruction(l_topic: str, l_image_title: str) -> str:
             return (
@@ -442,6 +452,7 @@ class FewShotProvider:
         return blackboard_text
 
     @classmethod
+    @traced
     def few_shot_LivestreamMessagesToTopics(self, livestreamMessages: list[LivestreamMessage], llm: str) -> str:
         chat_livestreamMessages_to_topics: Chat = Chat("You are an helpful assistant. Convert the user provided text messages, into a comma seperated list of topics.")
         few_shot_messages: list[LivestreamMessage] = []
@@ -486,6 +497,7 @@ class FewShotProvider:
         return self.session.generate_completion(chat_livestreamMessages_to_topics, llm, '["')
 
     @classmethod
+    @traced
     def few_shot_topicToSearch(
         self, topic: str, llm: str
     ):
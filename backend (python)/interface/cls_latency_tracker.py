@@ -0,0 +1,116 @@
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from classes.cls_tracer import percentile
+
+LATENCY_FILE = "./cache/ollama_latency.json"
+LATENCY_FILE_ENV = "OLLAMA_LATENCY_FILE"  # where the statistics are persisted, empty to keep them in memory only
+LATENCY_WINDOW = 50  # latest observations per model and prompt size the timeouts are derived from
+MIN_SAMPLES = 5  # fewer observations fall back to the model's other prompt sizes, then to the fixed defaults
+SAFETY_FACTOR = 3.0  # timeout = p95 * factor + slack, healthy outliers still finish
+SLACK = 10.0
+MIN_TIMEOUT = 20.0
+MAX_TIMEOUT = 900.0
+SAVE_INTERVAL = 60.0  # seconds between writes of the statistics, they are written by a background thread and at exit
+
+
+def prompt_size_bucket(prompt_chars: int) -> int:
+    """Prompts are grouped by powers of two of their length in thousands of characters: <2k, <4k, <8k, ..."""
+    return int(math.log2(max(prompt_chars / 1000, 1)))
+
+
+class LatencyTracker:
+    """
+    Observed latencies of the Ollama models per model, prompt size and modality, persisted across restarts.
+    total:       seconds until a non-streaming completion arrived
+    first_token: seconds until a streaming completion started, the prompt evaluation dominates it, so it bounds the gaps between tokens as well
+    """
+
+    def __init__(self, stats_file: Optional[str] = LATENCY_FILE):
+        """:param stats_file: Resolved against the working directory at construction, None keeps the statistics in memory only."""
+        self.stats_file = os.path.abspath(stats_file) if stats_file else None
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._save_lock = threading.Lock()  # one writer of the file at a time
+        if self.stats_file:
+            self._load(self.stats_file)
+            atexit.register(self.save)
+
+    def _load(self, stats_file: str) -> None:
+        if not os.path.exists(stats_file):
+            return
+        try:
+            with open(stats_file, "r") as json_file:
+                data: Dict[str, List[float]] = json.load(json_file)
+        except (json.JSONDecodeError, OSError) as e:
+            logging.error(f"Could not load Ollama latency statistics, starting with the default timeouts: {e}")
+            return
+        self._samples = {key: deque(samples, maxlen=LATENCY_WINDOW) for key, samples in data.items()}
+
+    def save(self) -> None:
+        """Writes the statistics if they changed, the file is replaced atomically."""
+        if not self.stats_file:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {key: list(samples) for key, samples in self._samples.items()}
+                self._dirty = False
+            try:
+                os.makedirs(os.path.dirname(self.stats_file), exist_ok=True)
+                tmp_file = self.stats_file + ".tmp"
+                with open(tmp_file, "w") as json_file:
+                    json.dump(data, json_file)
+                os.replace(tmp_file, self.stats_file)
+            except OSError as e:
+                logging.warning(f"Could not save Ollama latency statistics: {e}")
+
+    @staticmethod
+    def _keys(kind: str, model: str, prompt_chars: int, images: bool) -> List[str]:
+        """The exact key first, then the model wide one."""
+        modality = "images" if images else "text"
+        return [f"{kind}|{model}|{modality}|{prompt_size_bucket(prompt_chars)}", f"{kind}|{model}|{modality}|*"]
+
+    def observe(self, kind: str, model: str, prompt_chars: int, images: bool, seconds: float) -> None:
+        """Records a latency, the caller never waits for the file to be written."""
+        with self._lock:
+            for key in self._keys(kind, model, prompt_chars, images):
+                self._samples.setdefault(key, deque(maxlen=LATENCY_WINDOW)).append(round(seconds, 3))
+            self._dirty = True
+            save_due = bool(self.stats_file) and time.monotonic() - self._last_save >= SAVE_INTERVAL
+            if save_due:
+                self._last_save = time.monotonic()
+        if save_due:
+            threading.Thread(target=self.save, name="latency-statistics", daemon=True).start()
+
+    def timeout(self, kind: str, model: str, prompt_chars: int, images: bool) -> Optional[float]:
+        """Timeout derived from the observations, None until there are enough of them."""
+        with self._lock:
+            for key in self._keys(kind, model, prompt_chars, images):
+                samples = self._samples.get(key)
+                if samples and len(samples) >= MIN_SAMPLES:
+                    return min(max(percentile(list(samples), 0.95) * SAFETY_FACTOR + SLACK, MIN_TIMEOUT), MAX_TIMEOUT)
+        return None
+
+
+_latency_tracker: Optional[LatencyTracker] = None
+_latency_tracker_lock = threading.Lock()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Statistics shared by all requests of the process, loaded on first use so importing this module reads no files."""
+    global _latency_tracker
+    with _latency_tracker_lock:
+        if _latency_tracker is None:
+            _latency_tracker = LatencyTracker(os.getenv(LATENCY_FILE_ENV, LATENCY_FILE) or None)
+        return _latency_tracker
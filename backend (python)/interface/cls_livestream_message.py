@@ -10,6 +10,10 @@ class LivestreamMessage:
     def to_dict(self):
         return {"author": self.author, "message": self.message, "id": self.id}
 
+    @classmethod
+    def from_dict(cls, data: dict) -> "LivestreamMessage":
+        return cls(data["author"], data["message"], data.get("id", ""))
+
     def __str__(self):
         return f"Author: {self.author}, Message: {self.message}, ID: {self.id}"
 
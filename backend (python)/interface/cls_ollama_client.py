@@ -1,6 +1,5 @@
 import base64
 import hashlib
-import io
 import json
 import logging
 import os
@@ -8,13 +7,16 @@ import re
 import subprocess
 import time
 from io import BytesIO
-from typing import Any, Dict, List, Optional, Sequence, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import requests
 from jinja2 import Template
 from PIL import Image
 
+from classes.cls_metrics import metrics_registry
+from classes.cls_tracer import traced, tracer
 from interface.cls_chat import Chat, Role
+from interface.cls_latency_tracker import MAX_TIMEOUT, get_latency_tracker
 
 
 def reduce_image_resolution(base64_string: str, reduction_factor: float = 1 / 3) -> str:
@@ -36,8 +38,44 @@ def reduce_image_resolution(base64_string: str, reduction_factor: float = 1 / 3)
     return base64.b64encode(buffered.getvalue()).decode()
 
 
+# Native input resolution (longest side) of the vision models, llava 1.6 tiles up to 672x672 and llava 1.5 works on 336x336
+VISION_MODEL_INPUT_SIZES: Dict[str, int] = {
+    "llava:v1.6": 672,
+    "llava": 336,
+}
+DEFAULT_VISION_INPUT_SIZE = 672
+
+
+def vision_input_size(model: str) -> int:
+    if model in VISION_MODEL_INPUT_SIZES:
+        return VISION_MODEL_INPUT_SIZES[model]
+    return VISION_MODEL_INPUT_SIZES.get(model.split(":")[0], DEFAULT_VISION_INPUT_SIZE)
+
+
+def prepare_image_for_vision(base64_string: str, max_side: int = DEFAULT_VISION_INPUT_SIZE, quality: int = 90) -> str:
+    """Downscales the image to the vision model's input size and re-encodes it as JPEG, anything larger would only be resized by the model after transferring it."""
+    img: Image.Image = Image.open(BytesIO(base64.b64decode(base64_string)))
+    if img.format == "JPEG" and max(img.size) <= max_side:
+        return base64_string
+
+    img.draft("RGB", (max_side, max_side))  # decode JPEGs at a reduced scale right away
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        img = background
+    else:
+        img = img.convert("RGB")
+    img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    buffered = BytesIO()
+    img.save(buffered, format="JPEG", quality=quality, optimize=True)
+    return base64.b64encode(buffered.getvalue()).decode()
+
+
 # Configurations
-BASE_URL = "http://localhost:11434/api"
+BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/api")
+MANAGE_OLLAMA_CONTAINER = os.getenv("OLLAMA_MANAGE_CONTAINER", "1") != "0"  # 0 when Ollama is not run by docker, e.g. for the benchmarks' fake server
 # TIMEOUT = 240  # Timeout for API requests in seconds
 OLLAMA_CONTAINER_NAME = "ollama"  # Name of the Ollama Docker container
 OLLAMA_START_COMMAND = [
@@ -55,8 +93,13 @@ OLLAMA_START_COMMAND = [
     "ollama/ollama",
 ]
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+OLLAMA_COMPLETIONS = metrics_registry.counter("llm_classroom_ollama_completions_total", "Completions requested from the Ollama client", ("model", "cached"))
+
+CONNECT_TIMEOUT = 10  # Ollama runs next to the backend, connecting never takes long
+REQUEST_ATTEMPTS = 3
+TIMEOUT_BACKOFF = 2  # a retry of a learned timeout waits this many times longer, a slow but healthy model gets through on the next attempt
+MAX_TIMEOUT_BACKOFF = 2  # retries never wait longer than this multiple of the learned timeout
+
 logger = logging.getLogger(__name__)
 
 
@@ -72,7 +115,8 @@ class SingletonMeta(type):
 class OllamaClient(metaclass=SingletonMeta):
     def __init__(self, base_url: str = BASE_URL):
         self.base_url = base_url
-        self._ensure_container_running()
+        if MANAGE_OLLAMA_CONTAINER:
+            self._ensure_container_running()
         self.cache_file = "./cache/ollama_cache.json"
         self.cache = self._load_cache()
 
@@ -152,7 +196,6 @@ class OllamaClient(metaclass=SingletonMeta):
 
     def _load_cache(self):
         """Load cache from a file."""
-        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
         if not os.path.exists(self.cache_file):
             return {}  # Return an empty dictionary if file not found
 
@@ -178,42 +221,40 @@ class OllamaClient(metaclass=SingletonMeta):
         """Update the cache with new completion."""
         cache_key = self._generate_hash(model, temperature, prompt, images)
         self.cache[cache_key] = completion
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
         with open(self.cache_file, "w") as json_file:
             json.dump(self.cache, json_file, indent=4)
 
-    def _send_request(self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None, stream: bool = False) -> requests.Response:
-        """Send an HTTP request to the given endpoint with detailed colored logging and optional streaming."""
+    def _send_request(self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None, stream: bool = False, attempt: Optional[int] = None) -> requests.Response:
+        """
+        Send an HTTP request to the given endpoint with leveled logging and optional streaming, retried up to REQUEST_ATTEMPTS times.
+        :param attempt: Send only this attempt, with its timeout, for callers that retry on their own.
+        """
         url = f"{self.base_url}/{endpoint}"
-        timeout = 10  # Default timeout, adjust as needed for non-streaming requests
-
-        # Color codes for printing
-        CYAN = "\033[96m"
-        GREEN = "\033[92m"
-        YELLOW = "\033[93m"
-        RED = "\033[91m"
-        ENDC = "\033[0m"
+        timeout: Union[float, Tuple[float, float]] = 10  # Default timeout, adjust as needed for non-streaming requests
 
         # Attempt the request up to 3 times for reliability
-        for attempt in range(3):
+        attempts = range(REQUEST_ATTEMPTS) if attempt is None else range(attempt, attempt + 1)
+        for current_attempt in attempts:
+            start_time = time.time()
             try:
                 if method == "POST":
-                    # Adjust the timeout for "generate" endpoint based on data content
+                    # Derive the timeout of the "generate" endpoint from the model's observed latencies
                     if endpoint == "generate" and data:
-                        timeout = self._determine_timeout(data)
-                    start_time = time.time()
+                        timeout = (CONNECT_TIMEOUT, self._determine_timeout(data, stream, current_attempt))
 
                     # Log request start
-                    if data and "model" in data and "prompt" in data:
-                        request_info = f"Sending request to model: {data['model']}..."
-                        prompt_info = data["prompt"][:200].replace("\n", "")
-                        print(f"{CYAN}{request_info}\tPrompt: {prompt_info}{ENDC}")
+                    if data and "model" in data and "prompt" in data and logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Sending request", extra={"model": data["model"], "prompt": data["prompt"][:200].replace("\n", ""), "timeout": timeout})
 
                     response = requests.post(url, json=data, timeout=timeout, stream=stream)
 
-                    # Log duration for generate endpoint
-                    if endpoint == "generate":
+                    # Log and record the duration for generate endpoint, a streamed response returns with its first token
+                    if endpoint == "generate" and data:
                         duration = time.time() - start_time
-                        print(f"{GREEN}Request took {duration:.2f} seconds{ENDC}")
+                        logger.debug("Request done", extra={"model": data.get("model"), "duration": round(duration, 2), "stream": stream})
+                        if response.ok:
+                            get_latency_tracker().observe("first_token" if stream else "total", data.get("model", ""), len(data.get("prompt", "")), bool(data.get("images")), duration)
 
                 elif method == "GET":
                     response = requests.get(url, timeout=timeout, stream=stream)
@@ -231,23 +272,36 @@ class OllamaClient(metaclass=SingletonMeta):
                     raise requests.RequestException(f"HTTP {response.status_code}: {response.text}")
 
             except Exception as e:
+                # A timed out generation took at least this long, recording it keeps the statistics from only ever seeing the fast requests
+                if isinstance(e, requests.ReadTimeout) and endpoint == "generate" and data:
+                    get_latency_tracker().observe("first_token" if stream else "total", data.get("model", ""), len(data.get("prompt", "")), bool(data.get("images")), time.time() - start_time)
                 # Log error and retry logic
-                print(f"{RED}Request failed, attempt {attempt + 1}/3, error: {e}{ENDC}")
-                if attempt == 2:  # Final attempt
-                    print(f"{RED}Failed to send request after 3 attempts.{ENDC}")
+                logger.warning("Request failed", extra={"endpoint": endpoint, "attempt": f"{current_attempt + 1}/{REQUEST_ATTEMPTS}", "error": str(e)})
+                if current_attempt == REQUEST_ATTEMPTS - 1:  # Final attempt
+                    logger.error(f"Failed to send request after {REQUEST_ATTEMPTS} attempts", extra={"endpoint": endpoint})
                     raise
+                if attempt is not None:
+                    raise  # the caller retries
                 time.sleep(1)  # Backoff before retrying
         raise RuntimeError("Request failed after retries or due to an unsupported method.")
 
-    def _determine_timeout(self, data) -> int:
-        # Implement logic to determine the timeout based on the data provided
-        # Placeholder logic
+    def _determine_timeout(self, data: Dict[str, Any], stream: bool = False, attempt: int = 0) -> float:
+        """
+        Read timeout of a generate request, derived from the latencies observed for its model and prompt size.
+        A non-streaming request gets bounded by its expected total duration, a streaming one only by the idle time until the next token,
+        so long but healthy generations are never cut off. Until enough latencies were observed the fixed defaults apply to every attempt,
+        after that retries wait up to MAX_TIMEOUT_BACKOFF times longer in case the learned timeout was too tight.
+        """
         if "images" in data:
-            return 30
+            default = 30
         elif "xtral" in data.get("model", ""):
-            return 300
+            default = 300
         else:
-            return 120
+            default = 120
+        timeout = get_latency_tracker().timeout("first_token" if stream else "total", data.get("model", ""), len(data.get("prompt", "")), bool(data.get("images")))
+        if timeout is None:
+            return default
+        return min(timeout * min(TIMEOUT_BACKOFF**attempt, MAX_TIMEOUT_BACKOFF), MAX_TIMEOUT)
 
     def _get_template(self, model: str) -> str:
         data = {"name": model}
@@ -272,6 +326,7 @@ class OllamaClient(metaclass=SingletonMeta):
         
         return template_str
 
+    @traced
     def generate_completion(
         self,
         prompt: Chat | str,
@@ -286,6 +341,7 @@ class OllamaClient(metaclass=SingletonMeta):
         **kwargs,
     ) -> str:
         str_temperature:str = str(temperature)
+        tracer.annotate(model=model, cached=False)
         try:
             template_str = self._get_template(model)
             # Remove the redundant addition of start_response_with
@@ -301,10 +357,11 @@ class OllamaClient(metaclass=SingletonMeta):
 
             prompt_str += start_response_with
 
+            if len(images) > 0:
+                images = [prepare_image_for_vision(image_base64, vision_input_size(model)) for image_base64 in images]
+
             if "debug" in kwargs:
-                PURPLE = "\033[95m"
-                ENDC = "\033[0m"  # Resets the color to default after printing
-                print(f"{PURPLE}# # # # # # # # # # # # # DEBUG-START\n{prompt_str}\nDEBUG-END # # # # # # # # # # # #{ENDC}")
+                logger.debug(f"# # # # # # # # # # # # # DEBUG-START\n{prompt_str}\nDEBUG-END # # # # # # # # # # # #")
 
             # Check cache first
             if ignore_cache:
@@ -312,7 +369,9 @@ class OllamaClient(metaclass=SingletonMeta):
                 if cached_completion:
                     if (cached_completion == ""):
                         raise Exception("Error: This ollama request errored last timew as well.")
-                    print(f"Cache hit! For: {model}")
+                    logger.debug("Cache hit", extra={"model": model})
+                    tracer.annotate(cached=True)
+                    OLLAMA_COMPLETIONS.inc(model=model, cached="true")
                     if cached_completion == "None":
                         raise Exception("If this occurrs, you may delete the cache and remove this exception condition")
                     if include_start_response_str:
@@ -325,13 +384,6 @@ class OllamaClient(metaclass=SingletonMeta):
                 # your dictionary definition
             }
             if len(images) > 0:  # multimodal prompting
-                for image_base64 in images:
-                    image_bytes = base64.b64decode(image_base64)
-                    # Create a BytesIO object from the bytes and open the image
-                    image = Image.open(io.BytesIO(image_bytes))
-                    # Print the resolution
-                    print(f"Image Resolution: {image.size} (Width x Height)")
-
                 data = {
                     "model": model,
                     "prompt": prompt_str,
@@ -347,26 +399,21 @@ class OllamaClient(metaclass=SingletonMeta):
                     "stream": stream,
                     **kwargs,
                 }
-            response = self._send_request("POST", "generate", data, stream)
+            OLLAMA_COMPLETIONS.inc(model=model, cached="false")
+            if stream:
+                full_response = self._stream_completion(model, data)
+            else:
+                response_json = self._send_request("POST", "generate", data).json()
+                full_response = response_json.get("response", "")
+                tracer.record_tokens(model, response_json)
         except Exception as e:
             if len(images) > 0:
                 self._update_cache(model, str_temperature, prompt_str, images, "")
-            print(e)
+            logger.error("Completion failed", extra={"model": model, "error": str(e)})
             return ""
 
-        # Revised approach to handle streaming JSON responses
-        full_response = ""
-        if stream:
-            for line in response.iter_lines():
-                if line:
-                    json_obj = json.loads(line.decode("utf-8"))
-                    next_string = json_obj.get("response", "")
-                    full_response += next_string
-                    print(next_string, end="")
-                    if json_obj.get("done", False):
-                        break
-        else:
-            full_response = response.json().get("response", "")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Completion:\n{full_response}", extra={"model": model})
 
         # Update cache
         self._update_cache(model, str_temperature, prompt_str, images, full_response)
@@ -376,6 +423,32 @@ class OllamaClient(metaclass=SingletonMeta):
         else:
             return full_response
 
+    def _stream_completion(self, model: str, data: Dict[str, Any]) -> str:
+        """Collects a streamed completion, a generation that fails to start or stalls mid-way is re-issued. Both share the REQUEST_ATTEMPTS."""
+        for attempt in range(REQUEST_ATTEMPTS):
+            try:
+                response = self._send_request("POST", "generate", data, stream=True, attempt=attempt)  # logs its own failures
+            except requests.RequestException:
+                if attempt == REQUEST_ATTEMPTS - 1:
+                    raise
+                time.sleep(1)
+                continue
+            full_response = ""
+            try:
+                for line in response.iter_lines():
+                    if line:
+                        json_obj = json.loads(line.decode("utf-8"))
+                        full_response += json_obj.get("response", "")
+                        if json_obj.get("done", False):
+                            tracer.record_tokens(model, json_obj)
+                            break
+                return full_response
+            except requests.RequestException as e:  # no token arrived within the idle timeout, the generation is stuck
+                logger.warning("Completion stream stalled", extra={"model": model, "attempt": f"{attempt + 1}/{REQUEST_ATTEMPTS}", "error": str(e), "received_chars": len(full_response)})
+            finally:
+                response.close()
+        raise requests.RequestException(f"Completion stream stalled after {REQUEST_ATTEMPTS} attempts")
+
     def str_to_list(self, list_str: str) -> List[str]:
         chat = Chat()
         chat.add_message(
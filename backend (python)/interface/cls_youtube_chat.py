@@ -0,0 +1,35 @@
+from typing import List, Optional, Tuple
+
+from interface.cls_livestream_message import LivestreamMessage
+
+MAX_RESULTS = 2000  # the API's maximum page size, a backlog larger than this is caught up page by page, one per polling interval
+DEFAULT_POLLING_INTERVAL = 5.0  # seconds, used until YouTube names its own
+
+
+class LiveChatReader:
+    """
+    Reads a YouTube live chat incrementally: every fetch requests a single page, continuing at the nextPageToken of the previous one,
+    so each message is fetched once, and the wait until the next fetch is the pollingIntervalMillis YouTube asks for.
+    Works against the real client of googleapiclient as well as interface.cls_fake_youtube.FakeYouTube.
+    """
+
+    def __init__(self, youtube, live_chat_id: str):
+        self.youtube = youtube
+        self.live_chat_id = live_chat_id
+        self.page_token: Optional[str] = None
+        self.polling_interval: float = DEFAULT_POLLING_INTERVAL
+
+    def fetch_new_messages(self) -> Tuple[List[LivestreamMessage], float]:
+        """Returns the messages since the last fetch and the seconds to wait before fetching again, every call costs exactly one liveChatMessages request."""
+        request = self.youtube.liveChatMessages().list(liveChatId=self.live_chat_id, part="snippet,authorDetails", maxResults=MAX_RESULTS, pageToken=self.page_token)
+        response = request.execute()
+        chat_messages: List[LivestreamMessage] = []
+        for item in response["items"]:
+            author: str = item["authorDetails"]["displayName"]
+            message: str = item["snippet"]["displayMessage"]
+            message_id: str = item["id"]  # Unique identifier for each message
+            chat_messages.append(LivestreamMessage(author, message, message_id))
+
+        self.page_token = response.get("nextPageToken", self.page_token)
+        self.polling_interval = response.get("pollingIntervalMillis", self.polling_interval * 1000) / 1000
+        return chat_messages, self.polling_interval
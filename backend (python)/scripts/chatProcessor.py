@@ -6,26 +6,40 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-import json
+import argparse
+import logging
 import time
 from collections import Counter
 from typing import Dict, List, Tuple
 
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+import requests
 
-from classes.cls_poll import Poll
+from classes.cls_chat_log import ChatLog
+from classes.cls_logging import setup_logging
+from interface.cls_fake_youtube import FakeYouTube
 from interface.cls_livestream_message import LivestreamMessage
+from interface.cls_youtube_chat import LiveChatReader
+
+REST_API_URL = os.getenv("REST_API_URL", "http://localhost:5000")
+MAX_UNSENT_MESSAGES = 10000  # votes kept for a retry while the REST API is unreachable, the oldest are dropped beyond
+LOG_FILE = "./cache/logs/chat_processor.jsonl"
+
+logger = logging.getLogger("chatProcessor")
 
 # Set up YouTube API client
 scopes: List[str] = ["https://www.googleapis.com/auth/youtube.readonly"]
 api_service_name: str = "youtube"
 api_version: str = "v3"
 
-# Get credentials and create an API client
-flow = InstalledAppFlow.from_client_secrets_file("./cache/client_secret.json", scopes)
-credentials = flow.run_local_server(port=0)  # This will open a web server for authentication
-youtube = build(api_service_name, api_version, credentials=credentials)
+
+def create_youtube_client():
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from googleapiclient.discovery import build
+
+    # Get credentials and create an API client
+    flow = InstalledAppFlow.from_client_secrets_file("./cache/client_secret.json", scopes)
+    credentials = flow.run_local_server(port=0)  # This will open a web server for authentication
+    return build(api_service_name, api_version, credentials=credentials)
 
 
 def get_current_live_broadcast(youtube) -> Tuple[str, str]:
@@ -39,84 +53,58 @@ def get_current_live_broadcast(youtube) -> Tuple[str, str]:
             active_broadcast = next((item for item in response.get("items", []) if item["status"]["lifeCycleStatus"] == "live"), None)
 
             if not active_broadcast:
-                for i in range(60):
-                    os.system('cls' if os.name == 'nt' else 'clear')
-                    print(f"No active live broadcasts found. Retrying in {60 - i} seconds.")
-                    time.sleep(1)
-        except:
-            pass
-                
-    print("Broadcasts found!")
+                logger.info("No active live broadcasts found. Retrying in 60 seconds.")
+                time.sleep(60)
+        except Exception as e:
+            logger.warning(f"Could not list the live broadcasts: {e}")
+            time.sleep(1)
+
     broadcast_id: str = active_broadcast["id"]
     live_chat_id: str = active_broadcast["snippet"]["liveChatId"]
-    print(f"Broadcast ID: {broadcast_id}\nLive Chat ID: {live_chat_id}")
+    logger.info("Broadcast found", extra={"broadcast_id": broadcast_id, "live_chat_id": live_chat_id})
     return broadcast_id, live_chat_id
 
 
 
-def save_and_return_new_messages(messages: List[LivestreamMessage], fullChat_json_path: str = "./cache/fullChat.json") -> List[LivestreamMessage]:
-    os.makedirs(os.path.dirname(fullChat_json_path), exist_ok=True)  # Ensure directory exists
-
-    existing_data = []
-    if os.path.exists(fullChat_json_path):
+def add_poll_votes(messages: List[LivestreamMessage]) -> bool:
+    """Hands the new messages to the poll of the REST API, which owns the vote counts. Returns whether they were delivered."""
+    if not messages:
+        return True
+    try:
+        response = requests.post(f"{REST_API_URL}/addPollVotes", json={"messages": [message.to_dict() for message in messages]}, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.error(f"Could not send {len(messages)} poll votes to the REST API, retrying with the next messages: {e}")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest the livestream chat and forward poll votes to the REST API.")
+    parser.add_argument("--fake", action="store_true", help="Read a simulated chat of random votes instead of YouTube, no credentials needed")
+    args = parser.parse_args()
+
+    setup_logging(log_file=LOG_FILE)
+    youtube = FakeYouTube(chatter_per_second=2) if args.fake else create_youtube_client()
+
+    # Main execution loop
+    chat_log = ChatLog()
+    broadcast_id, live_chat_id = get_current_live_broadcast(youtube)
+    chat_reader = LiveChatReader(youtube, live_chat_id)
+    unsent_messages: List[LivestreamMessage] = []  # already in the chat log, so they are not read again, but not yet in the poll
+    while True:
         try:
-            with open(fullChat_json_path, "r") as file:
-                existing_data = json.load(file)
-        except json.JSONDecodeError:
-            print("Warning: Corrupt JSON file. Overwriting with new data.")
-
-    existing_message_ids = {item["id"] for item in existing_data}
+            chat_messages, polling_interval = chat_reader.fetch_new_messages()
+            new_chat_messages: List[LivestreamMessage] = chat_log.append(chat_messages)
+            unsent_messages = (unsent_messages + new_chat_messages)[-MAX_UNSENT_MESSAGES:]
+            if add_poll_votes(unsent_messages):
+                unsent_messages = []
+            if new_chat_messages:
+                logger.debug(f"Forwarded {len(new_chat_messages)} chat messages to the poll", extra={"messages": [message.to_dict() for message in new_chat_messages]})
+            time.sleep(polling_interval)  # YouTube tells how long to wait before asking for the next page
 
-    new_data = [message for message in messages if message.id not in existing_message_ids]
-
-    if new_data:
-        new_data_dict = [message.to_dict() for message in new_data]
-        # Combine existing and new data
-        combined_data = existing_data + new_data_dict
-        try:
-            with open(fullChat_json_path, "w") as file:
-                json.dump(combined_data, file, indent=4)
         except Exception as e:
-            print(f"Error saving messages: {e}")
-            return []  # Return an empty list to indicate failure
-
-    return new_data
-
-
-def get_chat_messages(youtube, live_chat_id: str) -> List[LivestreamMessage]:
-    request = youtube.liveChatMessages().list(liveChatId=live_chat_id, part="snippet, authorDetails")
-    response = request.execute()
-
-    chat_messages: List[LivestreamMessage] = []
-    for item in response["items"]:
-        author: str = item["authorDetails"]["displayName"]
-        message: str = item["snippet"]["displayMessage"]
-        message_id: str = item["id"]  # Unique identifier for each message
-        # print(f"{author}: {message}")
-        chat_messages.append(LivestreamMessage(author, message, message_id))
-
-    return chat_messages
-
-
-def add_poll_votes(messages: List[LivestreamMessage]) -> None:
-    poll = Poll.from_file()  # Load existing votes or initialize
-    for msg in messages:
-        poll.update_votes(msg.message)  # Update votes based on messages
-    poll.to_file()  # Save updated votes back to file
-
-
-# Main execution loop
-broadcast_id, live_chat_id = get_current_live_broadcast(youtube)
-while True:
-    try:
-        chat_messages = get_chat_messages(youtube, live_chat_id)
-        new_chat_messages: List[LivestreamMessage] = save_and_return_new_messages(chat_messages)
-        add_poll_votes(new_chat_messages)
-        print(new_chat_messages)
-        print("### Updated poll\n")
-        time.sleep(60)  # Wait for 10 seconds before the next iteration
-        
-    except Exception as e:
-        print("An error occurred: " + str(e))
-        time.sleep(120)  # Wait for 10 seconds before the next iteration
-        broadcast_id, live_chat_id = get_current_live_broadcast(youtube)
\ No newline at end of file
+            logger.exception(f"An error occurred: {e}")
+            time.sleep(120)  # Wait for 120 seconds before looking for the broadcast again
+            broadcast_id, live_chat_id = get_current_live_broadcast(youtube)
+            chat_reader = LiveChatReader(youtube, live_chat_id)
\ No newline at end of file
@@ -7,39 +7,47 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 import argparse
-import builtins
 import json
+import logging
 import os
 import random
 import re
 import shutil
 import time
-import traceback
 from random import shuffle
 from typing import Dict, List
 
 import torch
 from TTS.api import TTS
 
+from classes.cls_chat_log import ChatLog
+from classes.cls_chat_topic_pipeline import ChatTopicPipeline
+from classes.cls_episode_index import WIP_EPISODES_PATH, get_episode_index, is_ready, mark_ready
+from classes.cls_episode_meta import EpisodeMeta
+from classes.cls_episode_validator import validate_episodes
+from classes.cls_logging import setup_logging
+from classes.cls_metrics import metrics_registry, start_metrics_server
+from classes.cls_perceptual_hash import get_perceptual_hash_index
+from classes.cls_topic_queue import TopicQueue
+from classes.cls_tracer import tracer
 from classes.Episode import Episode
 from classes.Livestream import Livestream
 from classes.SupportedScenes import SupportedScenes
-from interface.cls_few_shot_factory import FewShotProvider
-from interface.cls_livestream_message import LivestreamMessage
 from interface.cls_ollama_client import OllamaClient
 
-# Save the original print function
-original_print = builtins.print
+# Leveled logging through a background thread, the verbosity is set with LLM_CLASSROOM_LOG_LEVEL
+setup_logging()
+logger = logging.getLogger("generateEpisodes")
 
+# The Ollama completions and cache hits are counted in this process, so it serves its own /metrics next to the REST API's, 0 turns it off
+METRICS_PORT = int(os.getenv("GENERATOR_METRICS_PORT", "9101"))
+EPISODES_PUBLISHED = metrics_registry.counter("llm_classroom_episodes_published_total", "Episodes the generator published")
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
 
-# Define a new print function that always flushes
-def print(*args, **kwargs):
-    kwargs.setdefault("flush", True)
-    return original_print(*args, **kwargs)
-
-
-# Override the built-in print with your custom print
-builtins.print = print
+# The store and the image index of the working directory, shared with the web scraper
+episode_index = get_episode_index()
+perceptual_hash_index = get_perceptual_hash_index()
 
 if not os.path.exists("./logs"):
     os.mkdir("./logs")
@@ -51,13 +59,12 @@ args = parser.parse_args()
 
 streaming_assets_path: str
 if args.prod:
-    print("Running in production mode")
+    logger.info("Running in production mode")
     streaming_assets_path = ""
 else:
-    print("Running in development mode")
+    logger.info("Running in development mode")
     streaming_assets_path = "C:/Users/Steffen/ai_livestream_URP/Assets/StreamingAssets/"
 
-llm_logging: Dict[str, List[float]] = {}
 current_llm_i: int = -1
 current_episode_i: int = 0
 episode_titles_to_choose_from = [
@@ -167,87 +174,61 @@ livestream = Livestream(
 def generate_episode(episode_title: str) -> None:
     try:
         llm = random.choice(llms)
-        episode_title = random.choice(episode_titles_to_choose_from)
-
-        start_time = time.time()  # Start timer
 
-        episode_identifier = sanitize_filename(f"{llm}_{episode_title}")
+        with tracer.span("episode", episode_title=episode_title, llm=llm):
+            episode_identifier = sanitize_filename(f"{llm}_{episode_title}")
 
-        WIP_path = f"./cache/WIP_episode/{episode_identifier}"  # Clean working folder
-        if os.path.exists("./cache/WIP_episode/"):
-            shutil.rmtree("./cache/WIP_episode/")
+            WIP_path = f"{WIP_EPISODES_PATH}{episode_identifier}"  # Clean working folder
+            if os.path.exists(WIP_EPISODES_PATH):
+                shutil.rmtree(WIP_EPISODES_PATH)
             os.makedirs(WIP_path)
 
-        episode = livestream.generate_episode(episode_title, supported_scenes, llm)
-
-        actions_generation_time = time.time() - start_time
-
-        # write actions to WIP
-        with open(WIP_path + "/actions.json", "w") as json_file:
-            json_file.write(episode.to_json())
-        # generate voices
-        for i, action in enumerate(episode.actions):
-            if action.voice_line:
-                if "Feynman" in action.character or "Richard" in action.character:
-                    synthesize_speech(
-                        action.voice_line,
-                        WIP_path,
-                        f"{i}_{action.character}.wav",
-                        "./voice_examples/FeynmanShort.wav",
-                    )
-                elif "Alice" in action.character:
-                    synthesize_speech(
-                        action.voice_line,
-                        WIP_path,
-                        f"{i}_{action.character}.wav",
-                        model="tts_models/en/ljspeech/tacotron2-DDC",
-                    )
-                elif "Watts" in action.character or "Alan" in action.character:
-                    synthesize_speech(
-                        action.voice_line,
-                        WIP_path,
-                        f"{i}_{action.character}.wav",
-                        "./voice_examples/AlanWattsShort.wav",
-                    )
-            print(f"\033[38;5;214mGenerating voices: {i+1}/{len(episode.actions)}\033[0m")
-
-        # move Episode from WIP to ready
-        episode_version = 0
-        while (
-            os.path.exists(f"./cache/shared/StreamingAssets/unreleased_episodes/{episode_version}_{episode_identifier}")
-            or os.path.exists(f"./cache/shared/StreamingAssets/prioritized_episodes/{episode_version}_{episode_identifier}")
-            or os.path.exists(f"./cache/shared/StreamingAssets/released_episodes/{episode_version}_{episode_identifier}")
-        ):
-            episode_version += 1
-        generated_episode_folder = f"./cache/shared/StreamingAssets/prioritized_episodes/{episode_version}_{episode_identifier}"
-        shutil.copytree(WIP_path, generated_episode_folder)
-        print(WIP_path)
-        print(generated_episode_folder)
-        shutil.rmtree(WIP_path)
-
-        # logging llm info
-        if actions_generation_time > 3:
-            if llm in llm_logging:
-                llm_logging[llm].append(actions_generation_time)
-            else:
-                llm_logging[llm] = [actions_generation_time]
-
-        # logging: Action speed evaluation printing
-        for llm_name in llm_logging.keys():
-            average_time = sum(llm_logging[llm_name]) / len(llm_logging[llm_name])
-            print(f"\033[38;5;255mAverage Time for {llm_name} to produce actions: {average_time:.0f} seconds\033[0m")
+            episode = livestream.generate_episode(episode_title, supported_scenes, llm)
+
+            # write actions and blackboard image to WIP
+            episode.save(WIP_path)
+            # generate voices
+            for i, action in enumerate(episode.actions):
+                if action.voice_line:
+                    with tracer.span("synthesize_speech", character=action.character, characters=len(action.voice_line)):
+                        if "Feynman" in action.character or "Richard" in action.character:
+                            synthesize_speech(
+                                action.voice_line,
+                                WIP_path,
+                                f"{i}_{action.character}.wav",
+                                "./voice_examples/FeynmanShort.wav",
+                            )
+                        elif "Alice" in action.character:
+                            synthesize_speech(
+                                action.voice_line,
+                                WIP_path,
+                                f"{i}_{action.character}.wav",
+                                model="tts_models/en/ljspeech/tacotron2-DDC",
+                            )
+                        elif "Watts" in action.character or "Alan" in action.character:
+                            synthesize_speech(
+                                action.voice_line,
+                                WIP_path,
+                                f"{i}_{action.character}.wav",
+                                "./voice_examples/AlanWattsShort.wav",
+                            )
+                logger.info(f"Generating voices: {i+1}/{len(episode.actions)}")
+
+            # move Episode from WIP to ready
+            with tracer.span("publish"):
+                episode_version = episode_index.next_version(episode_identifier)
+                generated_episode_folder = episode_index.publish(WIP_path, f"{episode_version}_{episode_identifier}")
+                perceptual_hash_index.commit_uses(episode_title)
+            EPISODES_PUBLISHED.inc()
+            logger.info("Published episode", extra={"wip_path": WIP_path, "episode_path": generated_episode_folder})
+
+        # logging: where the time of the recent episodes went, written to the trace file span by span
+        tracer.log_summary()
 
     except Exception as e:
-        print("\033[91mAn error occurred:\033[0m", e)
-
-        # Print file name and line number
-        tb = traceback.extract_tb(e.__traceback__)
-        filename, line, func, text = tb[-1]
-        print(f"\033[93mFile: {filename}, Line: {line}, In: {func}\033[0m")
-
-        # Separately print the full call stack
-        print("\033[94mCall Stack:\033[0m")
-        print("".join(traceback.format_tb(e.__traceback__)))
+        perceptual_hash_index.discard_uses(episode_title)
+        # The full call stack goes along with the record
+        logger.exception(f"An error occurred: {e}", extra={"episode_title": episode_title})
         raise (e)
         time.sleep(1)
 
@@ -258,47 +239,43 @@ def set_supported_scenes() -> None:
     with open("./cache/shared/supported_scenes.json", "r") as file:
         file_data = file.read()
 
-    print(file_data)
+    logger.debug("Supported scenes", extra={"supported_scenes": file_data})
     supported_scenes = SupportedScenes.from_json(file_data)
-    print("Supported scenes set successfully!")
+    logger.info("Supported scenes set successfully!")
+
+
+def prepare_unindexed_episode(episode_path: str) -> None:
+    """Migrates episodes from before meta.json, the sidecar image and the ready-marker once, the REST API only ever reads them."""
+    json_path = episode_path + "/actions.json"
+    try:
+        with open(json_path, "r") as file:
+            episode = Episode.from_json(file.read(), "", load_only=True)
+        if not EpisodeMeta.exists(episode_path) or episode.displayable_content.blackboard_image:  # an inline image moves into its sidecar file
+            created_at = os.path.getmtime(json_path)
+            if EpisodeMeta.exists(episode_path):  # its summary stays as it is
+                meta = EpisodeMeta.load(episode_path)
+                episode.llm, created_at = meta.llm, meta.created_at
+            episode.save(episode_path, created_at)
+        if not is_ready(episode_path):
+            mark_ready(episode_path)
+    except Exception as e:
+        logger.warning("Deleting faulty episode", extra={"reason": str(e), "episode_path": episode_path})
+        shutil.rmtree(episode_path)
 
 
 def validate_generated_episodes() -> None:
-    episode_paths: list[str] = []
-    for dir_path in os.listdir("./cache/shared/StreamingAssets/"):
-        episode_paths += [f"./cache/shared/StreamingAssets/{dir_path}/{episode_file}" for episode_file in os.listdir("./cache/shared/StreamingAssets/" + dir_path)]
-    for episode_path in episode_paths:
-        json_path = episode_path + "/actions.json"
-        try:
-            with open(json_path, "r") as file:
-                json_content = json.load(file)
-        except Exception as e:
-            print(f"\033[91mDELETING FAULTY EPISODE\tREASON: {e}\n{episode_path}\033[0m")
-            shutil.rmtree(episode_path)
-            continue
-
-        try:
-            episode = Episode.from_json(json.dumps(json_content), llms[0])
-            if (len(episode.actions) < 5):
-                shutil.rmtree(episode_path)
-        except Exception as e:
-            print(f"Error processing episode: {e}")
-            continue
-
-
-# def chat_to_topics(newMessages_json_path: str = "./newMessages.json"):
-#     newMessages: list[LivestreamMessage] = []
-#     with open(newMessages_json_path) as file:
-#         newMessages = json.load(file)
-#     topics: list[str] = FewShotProvider.few_shot_LivestreamMessagesToTopics(newMessages, llm)
+    validate_episodes(episode_index, prepare_unindexed_episode)
 
-validate_generated_episodes()
 
-# chat_based_episode_titles: list[str] = chat_to_topics()
-# generate_episodes(chat_based_episode_titles)
+validate_generated_episodes()
 
+# Topics requested in the livestream chat come first, the predefined titles fill the gaps
+topic_queue = TopicQueue()
+chat_topic_pipeline = ChatTopicPipeline(ChatLog(), topic_queue, episode_index, llm)
 
 while True:
     set_supported_scenes()
-    episode_title:str = random.choice(episode_titles_to_choose_from)
+    chat_topic_pipeline.process_new_messages()
+    episode_title: str = topic_queue.pop() or random.choice(episode_titles_to_choose_from)
+    topic_queue.save()
     generate_episode(episode_title)
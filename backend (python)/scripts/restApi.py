@@ -6,134 +6,437 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+import argparse
+import base64
+import gzip
 import json
 import logging
 import random
-import shutil
+import tarfile
+import tempfile
+import threading
+import time
 from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional, Union
 
-from flask import Flask, jsonify, request, send_file
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request, send_file, stream_with_context, url_for
 
-from classes.cls_poll import Poll
+from classes.cls_episode_index import EPISODE_STATES, EpisodeIndex, IndexedEpisode, is_ready
+from classes.cls_metrics import CONTENT_TYPE, metrics_registry
+from classes.cls_episode_queue import EpisodeQueue
+from classes.cls_logging import setup_logging
+from classes.cls_poll_service import PollService
+from classes.DisplayableContent import IMAGE_MIMETYPES, find_blackboard_image
 from classes.SupportedScenes import SupportedScenes
+from interface.cls_livestream_message import LivestreamMessage
 
+logger = logging.getLogger(__name__)
 
-def list_full_paths(directory):
-    """Returns the full paths of files in the given directory."""
-    return [os.path.join(directory, file) for file in os.listdir(directory)]
+api = Blueprint("api", __name__)
 
+MAX_RESERVED_EPISODES = 5
+LOG_FILE = "./cache/logs/rest_api.jsonl"  # the generator writes its own log file
+
+REQUEST_DURATION = metrics_registry.histogram("llm_classroom_http_request_duration_seconds", "Latency of the REST API until the response headers", ("route", "method"))
+REQUESTS = metrics_registry.counter("llm_classroom_http_requests_total", "Requests answered by the REST API", ("route", "method", "status"))
+AUDIO_BYTES = metrics_registry.counter("llm_classroom_audio_bytes_served_total", "Bytes of voice lines sent by /getAudio, partial responses included")
+
+
+class ApiState:
+    """State of one REST API process, attached to the app instead of living in module globals so every worker thread sees the same consistent data."""
+
+    def __init__(self, index: EpisodeIndex):
+        self.episode_index = index
+        self.episode_queue = EpisodeQueue(index)
+        self.poll_service = PollService()
+        self.supported_scenes: Optional[SupportedScenes] = None
+        self._lock = threading.Lock()
+        self._release_lock = threading.Lock()
+
+    def set_supported_scenes(self, supported_scenes: SupportedScenes) -> None:
+        with self._lock:
+            self.supported_scenes = supported_scenes
+            with open("./cache/shared/supported_scenes.json", "w") as file:
+                file.write(supported_scenes.to_json())
+
+    def _release(self, episode: IndexedEpisode) -> Optional[IndexedEpisode]:
+        """Moves the episode to released, None if it was deleted from the store since it was queued or reserved."""
+        try:
+            self.episode_index.move(episode.name, episode.state, "released")
+        except FileNotFoundError:
+            self.episode_index.remove(episode.name)
+            return None
+        return self.episode_index.get(episode.name)
+
+    def next_episode(self) -> Optional[IndexedEpisode]:
+        """Releases the episode to play next: the oldest reservation, else the next one of the queue. None if nothing is waiting."""
+        with self._release_lock:
+            for reservation in self.episode_index.list_reserved():
+                if released := self._release(reservation):
+                    return released
+            while episode := self.episode_queue.pop():
+                if released := self._release(episode):
+                    return released
+            return None
+
+    def reserve_episodes(self, count: int) -> List[IndexedEpisode]:
+        """
+        Reserves episodes until the next count ones are known, returns them in playback order. Fewer are returned if the queue runs dry.
+        Reservations are kept in the index, so they survive restarts, and the episodes are only released once they are played.
+        """
+        with self._release_lock:
+            reserved = self.episode_index.list_reserved()
+            while len(reserved) < count and (episode := self.episode_queue.pop()):
+                self.episode_index.set_reserved(episode.name, time.time())
+                reserved.append(episode)
+            return reserved[:count]
+
+
+def get_state() -> ApiState:
+    return current_app.extensions["llm_classroom"]
+
+
+def create_app() -> Flask:
+    os.makedirs("./cache/logs/", exist_ok=True)
+    # Setup file handler
+    file_handler = RotatingFileHandler("./cache/logs/logfile.log", maxBytes=1024 * 1024 * 100, backupCount=20)
+
+    app = Flask(__name__)
+    app.logger.addHandler(file_handler)
+    app.register_blueprint(api)
+
+    episode_index = EpisodeIndex()
+    episode_index.sync()
+    state = ApiState(episode_index)
+    state.poll_service.start()
+    app.extensions["llm_classroom"] = state
+    register_state_metrics(state)
+    return app
+
+
+def register_state_metrics(state: ApiState) -> None:
+    """Gauges read at scrape time, so /metrics always reports the current store and queue."""
+    index = state.episode_index
+    metrics_registry.gauge(
+        "llm_classroom_episodes", "Published episodes per state directory", ("state",), callback=lambda: {(episode_state,): index.count(episode_state) for episode_state in EPISODE_STATES}
+    )
+    metrics_registry.gauge("llm_classroom_episode_queue_length", "Episodes waiting to be released", callback=lambda: len(state.episode_queue))
+    metrics_registry.gauge("llm_classroom_reserved_episodes", "Episodes reserved for prefetching and not played yet", callback=index.count_reserved)
+    metrics_registry.gauge(
+        "llm_classroom_episodes_generated_last_hour", "Episodes the generator published within the last hour", callback=lambda: index.count_created_since(time.time() - 3600)
+    )
+
+
+@api.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@api.after_request
+def record_request_metrics(response: Response) -> Response:
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_DURATION.observe(time.perf_counter() - g.request_start, route=route, method=request.method)
+    REQUESTS.inc(route=route, method=request.method, status=str(response.status_code))
+    if request.endpoint == "api.get_audio" and response.status_code in (200, 206) and response.content_length:
+        AUDIO_BYTES.inc(response.content_length)
+    return response
 
-logging.basicConfig(level=logging.ERROR, format="%(asctime)s %(levelname)s %(name)s %(message)s")
-logger = logging.getLogger(__name__)
 
-if not os.path.exists("./cache/logs/"):
-    os.mkdir("./cache/logs/")
-# Setup file handler
-file_handler = RotatingFileHandler("./cache/logs/logfile.log", maxBytes=1024 * 1024 * 100, backupCount=20)
+AUDIO_MAX_AGE = 365 * 24 * 60 * 60  # for urls carrying the file's version, another file under the same name gets another url
 
-app = Flask(__name__)
-app.logger.addHandler(file_handler)
 
-supported_scenes: SupportedScenes  # To store supported scenes data
+def file_version(file_path: str) -> str:
+    """Changes whenever the file is replaced, e.g. when a deleted episode's name is reused by a re-generated one."""
+    stat = os.stat(file_path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
 
 
-@app.route("/setSupportedScenes", methods=["PUT"])
+def audio_cache_control(file_path: str) -> str:
+    """Long-lived caching only for requests naming the current version of the file with ?v=, everything else is revalidated by ETag."""
+    if request.args.get("v") == file_version(file_path):
+        return f"public, max-age={AUDIO_MAX_AGE}, immutable"
+    return "no-cache"
+
+
+def resolve_episode_path(episode_path: str) -> str:
+    """Paths handed out with a reservation point into the pending directories, once the episode was released it is found by its folder name."""
+    if os.path.isdir(episode_path):
+        return episode_path
+    episode = get_state().episode_index.get(os.path.basename(os.path.normpath(episode_path)))
+    return episode.path if episode else episode_path
+
+
+def gzipped_copy(file_path: str) -> str:
+    """Returns the path of a pre-gzipped copy of the file, (re)creating it if it is missing or outdated."""
+    gz_path = file_path + ".gz"
+    if not os.path.exists(gz_path) or os.path.getmtime(gz_path) < os.path.getmtime(file_path):
+        with open(file_path, "rb") as file:
+            compressed = gzip.compress(file.read(), compresslevel=9)
+        # a unique temporary file per writer, concurrent requests of the same episode must not write into each other's copy
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(gz_path) + ".", suffix=".tmp", dir=os.path.dirname(gz_path))
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(compressed)
+            os.replace(tmp_path, gz_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return gz_path
+
+
+def inline_image_json(json_path: str, image_path: str) -> bytes:
+    """actions.json with the sidecar blackboard image embedded as base64, the format clients reading the image from the episode expect."""
+    with open(json_path, "r") as file:
+        episode = json.load(file)
+    with open(image_path, "rb") as file:
+        episode["displayable_content"]["blackboard_image"] = base64.b64encode(file.read()).decode()
+    return json.dumps(episode).encode()
+
+
+def audio_manifest(episode_path: str, actions: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Union[str, int]]]:
+    """Lists the existing voice line files of an episode in playback order."""
+    if actions is None:
+        with open(episode_path + "/actions.json", "r") as file:
+            actions = json.load(file)["actions"]
+    manifest: List[Dict[str, Union[str, int]]] = []
+    for action_index, action in enumerate(actions):
+        audio_file_name = f"{action_index}_{action['character']}.wav"
+        audio_file_path = os.path.join(episode_path, audio_file_name)
+        if os.path.exists(audio_file_path):
+            manifest.append(
+                {
+                    "actionIndex": action_index,
+                    "character": action["character"],
+                    "file": audio_file_name,
+                    "size": os.path.getsize(audio_file_path),
+                    "url": url_for("api.get_audio", episodePath=episode_path, character=action["character"], actionIndex=action_index, v=file_version(audio_file_path), _external=True),
+                }
+            )
+    return manifest
+
+
+def episode_manifest(episode_path: str) -> Dict[str, Any]:
+    """Everything the client needs to prefetch an episode: its actions, the blackboard image url and the voice lines."""
+    with open(episode_path + "/actions.json", "r") as file:
+        episode = json.load(file)
+    image_url = url_for("api.get_image", episodePath=episode_path, _external=True) if find_blackboard_image(episode_path) else None
+    return {"episode_path": episode_path, "episode": episode, "image_url": image_url, "audio": audio_manifest(episode_path, episode["actions"])}
+
+
+class _TarStreamBuffer:
+    """Write-only file object collecting the blocks tarfile produces, so the archive can be streamed while it is written."""
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_tar(file_paths: List[str]) -> Iterator[bytes]:
+    buffer = _TarStreamBuffer()
+    with tarfile.open(fileobj=buffer, mode="w|") as tar:  # type: ignore[call-overload]
+        for file_path in file_paths:
+            tar.add(file_path, arcname=os.path.basename(file_path))
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+@api.route("/setSupportedScenes", methods=["PUT"])
 def set_supported_scenes():
-    global supported_scenes
     data = request.json
-    supported_scenes = SupportedScenes.from_json(json.dumps(data))
-    with open("./cache/shared/supported_scenes.json", "w") as file:
-        file.write(supported_scenes.to_json())
+    get_state().set_supported_scenes(SupportedScenes.from_json(json.dumps(data)))
     return "Supported scenes set successfully!"
 
 
-@app.route("/chooseEpisodePath", methods=["GET"])
+@api.route("/chooseEpisodePath", methods=["GET"])
 def choose_episode_path():
+    state = get_state()
     try:
-        prioritized_episodes_directory = "./cache/shared/StreamingAssets/prioritized_episodes/"
-        unreleased_episodes_directory = "./cache/shared/StreamingAssets/unreleased_episodes/"
-        released_episodes_directory = "./cache/shared/StreamingAssets/released_episodes/"
-
-        prioritized_episodes = list_full_paths(prioritized_episodes_directory)  # Full paths for boosted episodes
-        unreleased_episodes = prioritized_episodes + list_full_paths(unreleased_episodes_directory)  # Full paths for unreleased episodes
-        released_episodes = list_full_paths(released_episodes_directory)  # Full paths for released episodes
-
-        if not unreleased_episodes:
-            # Fallback to replaying old episodes
-            episode_to_play = random.choice(released_episodes)
-            app.logger.info(f"Replaying episode: {episode_to_play}")
-            print(f"Replaying episode: {episode_to_play}")
-            released_path = episode_to_play
+        # Reserved episodes first, then the next of the queue: prioritized (boosted) episodes first, then the oldest
+        episode = state.next_episode()
+        if episode:
+            logger.info(f"Releasing episode: {episode.path}")
         else:
-            # Selecting an episode from the top 3 of the list
-            episode_to_play = random.choice(unreleased_episodes[:3])
-            app.logger.info(f"Releasing episode: {episode_to_play}")
-            print(f"Releasing episode: {episode_to_play}")
-            released_path = os.path.join(released_episodes_directory, os.path.basename(episode_to_play))
-            if os.path.exists(released_path):
-                shutil.rmtree(released_path, True)
-            shutil.move(episode_to_play, released_path)
+            # Fallback to replaying old episodes
+            episode = random.choice(state.episode_index.list("released"))
+            logger.info(f"Replaying episode: {episode.path}")
+        state.episode_index.record_play(episode.name)
 
-        return jsonify({"episode_path": released_path})
+        return jsonify({"episode_path": episode.path})
 
     except Exception as e:
-        app.logger.error(f"Error in choose_episode_path: {e}")
+        current_app.logger.error(f"Error in choose_episode_path: {e}")
         return jsonify({"error": str(e)})
 
 
-@app.route("/getEpisode", methods=["GET"])
+@api.route("/reserveEpisodes", methods=["GET"])
+def reserve_episodes():
+    """Manifests of the episodes /chooseEpisodePath will return next, so the client can prefetch them while the current one plays."""
+    try:
+        count = min(max(int(request.args.get("count", 1)), 1), MAX_RESERVED_EPISODES)
+        episodes = get_state().reserve_episodes(count)
+        return jsonify({"episodes": [episode_manifest(episode.path) for episode in episodes]})
+    except Exception as e:
+        logger.exception(f"Error reserving episodes: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/getEpisode", methods=["GET"])
 def get_episode():
+    """
+    The episode's actions.json with its blackboard image inlined, as the frontend reads it from there.
+    Clients loading the image from image_url pass image=url and get the stored bytes as they are.
+    """
     episode_path = request.args.get("path")
     if not episode_path:
         raise Exception("path missing in get request")
+    episode_path = resolve_episode_path(episode_path)
+    if not is_ready(episode_path):
+        return jsonify({"error": "episode is not published"}), 404
     try:
-        with open(episode_path + "/actions.json", "r") as file:
-            episode_data = json.load(file)
-        return jsonify(episode_data)
+        # actions.json is static once published, so its bytes are served as they are, 304s are handled by send_file via ETag and Last-Modified
+        json_path = os.path.abspath(episode_path + "/actions.json")
+        image_path = find_blackboard_image(episode_path)
+        if image_path and request.args.get("image", "inline") == "inline":
+            response = Response(inline_image_json(json_path, image_path), mimetype="application/json")
+            response.set_etag(f"{file_version(json_path)}-{file_version(image_path)}")
+            return response.make_conditional(request)
+        if request.accept_encodings["gzip"] > 0:  # honours q-values, "gzip;q=0" refuses it
+            response = send_file(gzipped_copy(json_path), mimetype="application/json", conditional=True, etag=True)
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = send_file(json_path, mimetype="application/json", conditional=True, etag=True)
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
     except Exception as e:
         logger.exception(f"Error loading episode: {e}")
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/getAudio", methods=["GET"])
+@api.route("/getImage", methods=["GET"])
+def get_image():
+    episode_path = request.args.get("episodePath")
+    if not episode_path:
+        raise Exception("episode path missing in get request")
+    episode_path = resolve_episode_path(episode_path)
+    try:
+        image_path = find_blackboard_image(episode_path)
+        if not image_path:
+            return jsonify({"error": "episode has no blackboard image"}), 404
+        return send_file(os.path.abspath(image_path), mimetype=IMAGE_MIMETYPES[os.path.splitext(image_path)[1]])
+    except Exception as e:
+        logger.exception(f"Error fetching image file: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/getAudio", methods=["GET"])
 def get_audio():
     episode_path = request.args.get("episodePath")
     if not episode_path:
         raise Exception("episode path missing in get request")
+    episode_path = resolve_episode_path(episode_path)
     character = request.args.get("character")
     action_index = request.args.get("actionIndex")
     try:
         audio_file_name = f"{action_index}_{character}.wav"
-        audio_file_path = episode_path + "/" + audio_file_name
-        return send_file("." + audio_file_path, mimetype="audio/wav")
+        audio_file_path = os.path.abspath(episode_path + "/" + audio_file_name)
+        # conditional=True answers Range requests with 206 and If-None-Match / If-Modified-Since with 304
+        response = send_file(audio_file_path, mimetype="audio/wav", conditional=True, etag=True)
+        response.headers["Cache-Control"] = audio_cache_control(audio_file_path)
+        return response
     except Exception as e:
         logger.exception(f"Error fetching audio file: {e}")
         return jsonify({"error": str(e)}), 500
 
+
+@api.route("/getAudioManifest", methods=["GET"])
+def get_audio_manifest():
+    episode_path = request.args.get("episodePath")
+    if not episode_path:
+        raise Exception("episode path missing in get request")
+    episode_path = resolve_episode_path(episode_path)
+    try:
+        archive_url = url_for("api.get_episode_audio", episodePath=episode_path, v=file_version(episode_path + "/actions.json"), _external=True)
+        return jsonify({"episode_path": episode_path, "audio": audio_manifest(episode_path), "archive_url": archive_url})
+    except Exception as e:
+        logger.exception(f"Error building audio manifest: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/getEpisodeAudio", methods=["GET"])
+def get_episode_audio():
+    """All voice lines of an episode as one uncompressed tar stream, named like the files of /getAudio."""
+    episode_path = request.args.get("episodePath")
+    if not episode_path:
+        raise Exception("episode path missing in get request")
+    episode_path = resolve_episode_path(episode_path)
+    try:
+        file_paths = [os.path.join(episode_path, str(entry["file"])) for entry in audio_manifest(episode_path)]
+        response = Response(stream_with_context(stream_tar(file_paths)), mimetype="application/x-tar")
+        response.headers["Content-Disposition"] = f"attachment; filename={os.path.basename(os.path.normpath(episode_path))}_audio.tar"
+        response.headers["Cache-Control"] = audio_cache_control(episode_path + "/actions.json")  # re-generating an episode rewrites its actions.json
+        return response
+    except Exception as e:
+        logger.exception(f"Error streaming episode audio: {e}")
+        return jsonify({"error": str(e)}), 500
+
         
-@app.route("/resetPoll", methods=["GET"])
+@api.route("/resetPoll", methods=["GET"])
 def reset_poll():
-    released_episodes_directory = "./cache/shared/StreamingAssets/released_episodes/"
-
-    released_episodes = list_full_paths(released_episodes_directory)  # Full paths for released episodes
+    released_episodes = [episode.path for episode in get_state().episode_index.list("released")]  # Full paths for released episodes
 
     next_episode_options = random.choices(released_episodes, k=3)
-    poll: Poll  = Poll(next_episode_options)
     try:
-        poll.to_file()
+        poll = get_state().poll_service.reset(next_episode_options)
         return poll.to_json(), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/getPoll", methods=["GET"])
+@api.route("/getPoll", methods=["GET"])
 def get_poll():
     try:
-        poll = Poll.from_file()
-        return poll.to_json(), 200
+        return get_state().poll_service.to_json(), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@api.route("/addPollVotes", methods=["POST"])
+def add_poll_votes():
+    """Counts the chat messages posted by the chat processor as votes, body: {"messages": [{"author", "message", "id"}, ...]}"""
+    try:
+        messages = [LivestreamMessage(item["author"], item["message"], item.get("id", "")) for item in request.json["messages"]]
+        get_state().poll_service.add_votes(messages)
+        return jsonify({"counted": len(messages)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@api.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics_registry.render(), mimetype=CONTENT_TYPE)
+
+
 if __name__ == "__main__":
-    app.run(debug=False, host="localhost", port=5000)
+    parser = argparse.ArgumentParser(description="Serve the episodes to the Unity frontend.")
+    parser.add_argument("-p", "--prod", action="store_true", help="Serve with the multi-threaded waitress WSGI server instead of Flask's development server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=16, help="Worker threads of the production server")
+    args = parser.parse_args()
+
+    setup_logging(log_file=LOG_FILE)
+    app = create_app()
+    if args.prod:
+        from waitress import serve
+
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+    else:
+        app.run(debug=False, host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,17 @@
+import os
+import sys
+
+# Add the root directory of your project to sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from classes.cls_logging import setup_logging
+from scripts.restApi import LOG_FILE, create_app
+
+# Entry point for WSGI servers, run from the backend folder so ./cache resolves:
+#   waitress-serve --threads=16 --port=5000 scripts.wsgi:app
+#   gunicorn --worker-class gthread --workers 1 --threads 16 --bind 0.0.0.0:5000 scripts.wsgi:app
+# Keep to a single worker process, the API state (supported scenes, episode selection) lives in-process and is shared between its threads.
+setup_logging(log_file=LOG_FILE)
+app = create_app()
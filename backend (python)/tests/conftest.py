@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The backend is not an installed package, its modules are imported from this folder like the scripts do
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+os.environ.setdefault("OLLAMA_MANAGE_CONTAINER", "0")  # importing the Ollama client must not touch docker
+
+
+@pytest.fixture(autouse=True)
+def working_directory(tmp_path, monkeypatch):
+    """Everything the backend writes relative to ./cache ends up in a fresh folder per test."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
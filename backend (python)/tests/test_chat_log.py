@@ -0,0 +1,62 @@
+import json
+import os
+
+from classes.cls_chat_log import ChatLog
+from interface.cls_livestream_message import LivestreamMessage
+
+LOG_FILE = "./cache/chat_log.jsonl"
+LEGACY_FILE = "./cache/fullChat.json"
+
+
+def texts(messages):
+    return [message.message for message in messages]
+
+
+def test_append_skips_logged_messages():
+    chat_log = ChatLog(LOG_FILE, LEGACY_FILE)
+    assert len(chat_log.append([LivestreamMessage("alice", "hi", "1"), LivestreamMessage("bob", "hello", "2")])) == 2
+
+    new_messages = ChatLog(LOG_FILE, LEGACY_FILE).append([LivestreamMessage("bob", "hello", "2"), LivestreamMessage("carol", "hey", "3")])
+
+    assert texts(new_messages) == ["hey"]
+    assert texts(ChatLog(LOG_FILE, LEGACY_FILE).read_from(0)[0]) == ["hi", "hello", "hey"]
+
+
+def test_read_from_continues_at_the_offset():
+    chat_log = ChatLog(LOG_FILE, LEGACY_FILE)
+    chat_log.append([LivestreamMessage("alice", "hi", "1")])
+    messages, offset = chat_log.read_from(0)
+    assert texts(messages) == ["hi"]
+
+    chat_log.append([LivestreamMessage("bob", "hello", "2")])
+    messages, next_offset = chat_log.read_from(offset)
+
+    assert texts(messages) == ["hello"]
+    assert chat_log.read_from(next_offset) == ([], next_offset)
+    assert chat_log.end_offset() == next_offset
+
+
+def test_torn_last_line_is_ignored_by_readers_and_dropped_on_append():
+    ChatLog(LOG_FILE, LEGACY_FILE).append([LivestreamMessage("alice", "hi", "1")])
+    with open(LOG_FILE, "a") as file:
+        file.write('{"author": "bob", "mess')  # a crash in the middle of an append
+    chat_log = ChatLog(LOG_FILE, LEGACY_FILE)
+
+    messages, offset = chat_log.read_from(0)
+    assert texts(messages) == ["hi"]
+    assert chat_log.end_offset() == offset
+
+    chat_log.append([LivestreamMessage("bob", "hello", "2")])
+    assert texts(chat_log.read_from(0)[0]) == ["hi", "hello"]
+    assert texts(chat_log.read_from(offset)[0]) == ["hello"]
+
+
+def test_legacy_chat_is_imported_once():
+    os.makedirs(os.path.dirname(LEGACY_FILE))
+    with open(LEGACY_FILE, "w") as file:
+        json.dump([{"author": "alice", "message": "hi", "id": "1"}], file)
+
+    ChatLog(LOG_FILE, LEGACY_FILE)
+    ChatLog(LOG_FILE, LEGACY_FILE)
+
+    assert texts(ChatLog(LOG_FILE, LEGACY_FILE).read_from(0)[0]) == ["hi"]
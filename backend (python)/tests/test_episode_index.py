@@ -0,0 +1,58 @@
+import os
+
+from classes.cls_episode_index import EpisodeIndex, mark_ready, state_directory
+from classes.cls_episode_meta import EpisodeMeta
+
+DB_PATH = "./cache/shared/episode_index.sqlite3"
+
+
+def make_episode(state, name, ready=True):
+    episode_path = os.path.join(state_directory(state), name)
+    os.makedirs(episode_path)
+    EpisodeMeta(name, [], 5, created_at=1.0).save(episode_path)
+    if ready:
+        mark_ready(episode_path)
+    return episode_path
+
+
+def test_sync_indexes_ready_episodes_only():
+    make_episode("released", "0_model_Ready")
+    make_episode("unreleased", "0_model_Unfinished", ready=False)
+    index = EpisodeIndex(DB_PATH)
+
+    index.sync()
+
+    assert [episode.name for episode in index.list()] == ["0_model_Ready"]
+
+
+def test_sync_follows_moves_and_deletions():
+    make_episode("released", "0_model_Kept")
+    make_episode("unreleased", "0_model_Deleted")
+    index = EpisodeIndex(DB_PATH)
+    index.sync()
+    os.rename(os.path.join(state_directory("released"), "0_model_Kept"), os.path.join(state_directory("prioritized"), "0_model_Kept"))
+    os.rename(os.path.join(state_directory("unreleased"), "0_model_Deleted"), "./deleted")
+
+    index.sync()
+
+    assert [(episode.name, episode.state) for episode in index.list()] == [("0_model_Kept", "prioritized")]
+
+
+def test_other_writers_are_not_blocked_while_episodes_are_prepared():
+    make_episode("released", "0_model_Indexed")
+    EpisodeIndex(DB_PATH).sync()
+    make_episode("unreleased", "0_model_Legacy", ready=False)
+    make_episode("unreleased", "0_model_Older_Legacy", ready=False)
+    rest_api = EpisodeIndex(DB_PATH)
+    rest_api.connection.execute("PRAGMA busy_timeout = 100")  # a blocked write fails fast instead of after 30 seconds
+
+    def prepare_episode(episode_path):
+        rest_api.record_play("0_model_Indexed")  # raises "database is locked" if sync holds the write lock
+        mark_ready(episode_path)
+
+    index = EpisodeIndex(DB_PATH)
+    index.sync(prepare_episode)
+
+    assert sorted(episode.name for episode in index.list()) == ["0_model_Indexed", "0_model_Legacy", "0_model_Older_Legacy"]
+    indexed = index.get("0_model_Indexed")
+    assert indexed is not None and indexed.play_count == 2
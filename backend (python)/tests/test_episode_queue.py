@@ -0,0 +1,74 @@
+import threading
+
+from classes.cls_episode_index import EpisodeIndex
+from classes.cls_episode_meta import EpisodeMeta
+from classes.cls_episode_queue import EpisodeQueue
+
+DB_PATH = "./cache/shared/episode_index.sqlite3"
+
+
+def add(index, name, state, created_at):
+    index.add(name, state, EpisodeMeta(name, [], 5, created_at=created_at))
+
+
+def names(queue):
+    popped = []
+    while (episode := queue.pop()) is not None:
+        popped.append(episode.name)
+    return popped
+
+
+def test_prioritized_first_then_oldest_first():
+    generator = EpisodeIndex(DB_PATH)
+    add(generator, "0_model_Unreleased_New", "unreleased", 3)
+    add(generator, "0_model_Unreleased_Old", "unreleased", 1)
+    add(generator, "0_model_Prioritized", "prioritized", 2)
+    add(generator, "0_model_Released", "released", 0)
+
+    queue = EpisodeQueue(EpisodeIndex(DB_PATH))
+
+    assert len(queue) == 3
+    assert names(queue) == ["0_model_Prioritized", "0_model_Unreleased_Old", "0_model_Unreleased_New"]
+    assert len(queue) == 0
+
+
+def test_published_episodes_are_queued_without_repeating_taken_ones():
+    generator = EpisodeIndex(DB_PATH)
+    add(generator, "0_model_First", "unreleased", 1)
+    add(generator, "0_model_Second", "unreleased", 2)
+    queue = EpisodeQueue(EpisodeIndex(DB_PATH))
+    first = queue.pop()
+    assert first is not None and first.name == "0_model_First"
+
+    add(generator, "0_model_Boosted", "prioritized", 3)  # the generator commits, the queue is rebuilt
+
+    assert names(queue) == ["0_model_Boosted", "0_model_Second"]
+
+
+def test_reserved_episodes_are_skipped():
+    generator = EpisodeIndex(DB_PATH)
+    add(generator, "0_model_First", "unreleased", 1)
+    add(generator, "0_model_Second", "unreleased", 2)
+    generator.set_reserved("0_model_First", 100.0)
+
+    assert names(EpisodeQueue(EpisodeIndex(DB_PATH))) == ["0_model_Second"]
+
+
+def test_concurrent_pops_hand_out_every_episode_once():
+    generator = EpisodeIndex(DB_PATH)
+    for i in range(50):
+        add(generator, f"0_model_Episode{i}", "unreleased", i)
+    queue = EpisodeQueue(EpisodeIndex(DB_PATH))
+    popped = []
+
+    def worker():
+        while (episode := queue.pop()) is not None:
+            popped.append(episode.name)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(popped) == sorted(f"0_model_Episode{i}" for i in range(50))
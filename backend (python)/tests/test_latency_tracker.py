@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from interface import cls_ollama_client
+from interface.cls_latency_tracker import MIN_SAMPLES, MIN_TIMEOUT, LatencyTracker, prompt_size_bucket
+from interface.cls_ollama_client import MAX_TIMEOUT_BACKOFF, REQUEST_ATTEMPTS, OllamaClient
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = LatencyTracker(None)
+    monkeypatch.setattr(cls_ollama_client, "get_latency_tracker", lambda: tracker)
+    return tracker
+
+
+def observe(tracker, seconds, count=MIN_SAMPLES, prompt_chars=500, kind="total"):
+    for _ in range(count):
+        tracker.observe(kind, "model", prompt_chars, False, seconds)
+
+
+def test_prompt_size_bucket():
+    assert prompt_size_bucket(0) == 0
+    assert prompt_size_bucket(1999) == 0
+    assert prompt_size_bucket(2000) == 1
+    assert prompt_size_bucket(9000) == 3
+
+
+def test_timeout_needs_enough_samples(tracker):
+    observe(tracker, 10.0, MIN_SAMPLES - 1)
+    assert tracker.timeout("total", "model", 500, False) is None
+
+    observe(tracker, 10.0, 1)
+    assert tracker.timeout("total", "model", 500, False) == 10.0 * 3 + 10
+
+
+def test_timeout_falls_back_to_other_prompt_sizes_of_the_model(tracker):
+    observe(tracker, 10.0, prompt_chars=500)
+
+    assert tracker.timeout("total", "model", 50_000, False) == 40.0
+    assert tracker.timeout("total", "model", 500, True) is None  # images are another modality
+    assert tracker.timeout("total", "other-model", 500, False) is None
+
+
+def test_statistics_survive_a_restart(working_directory):
+    tracker = LatencyTracker("./cache/ollama_latency.json")
+    observe(tracker, 10.0)
+    os.chdir("/")  # the path was resolved when the tracker was created
+    tracker.save()
+
+    stats_file = str(working_directory / "cache" / "ollama_latency.json")
+    assert tracker.stats_file == stats_file
+    assert LatencyTracker(stats_file).timeout("total", "model", 500, False) == 40.0
+
+
+def test_default_applies_until_latencies_were_observed(tracker):
+    client = OllamaClient()
+    data = {"model": "model", "prompt": "x" * 500}
+
+    assert [client._determine_timeout(data, attempt=attempt) for attempt in range(REQUEST_ATTEMPTS)] == [120, 120, 120]
+
+
+def test_learned_timeout_may_undercut_the_default_and_retries_are_capped(tracker):
+    client = OllamaClient()
+    data = {"model": "model", "prompt": "x" * 500}
+    observe(tracker, 2.0)
+
+    timeouts = [client._determine_timeout(data, attempt=attempt) for attempt in range(REQUEST_ATTEMPTS)]
+
+    assert timeouts[0] == MIN_TIMEOUT
+    assert max(timeouts) == MIN_TIMEOUT * MAX_TIMEOUT_BACKOFF
+
+
+class StallingOllamaServer(FakeOllamaServer):
+    """Stops sending tokens in the middle of the first stalled_requests streamed completions."""
+
+    def __init__(self, stalled_requests: int):
+        super().__init__()
+        self.stalled_requests = stalled_requests
+
+    def token_delay(self) -> float:
+        return 2.0 if self.requests <= self.stalled_requests else 0.0
+
+
+@pytest.fixture
+def short_idle_timeout(monkeypatch):
+    monkeypatch.setattr(OllamaClient, "_determine_timeout", lambda self, data, stream=False, attempt=0: 0.2)
+
+
+def test_stalled_stream_is_reissued(tracker, short_idle_timeout, monkeypatch):
+    with StallingOllamaServer(stalled_requests=1) as server:
+        monkeypatch.setattr(OllamaClient(), "base_url", server.base_url)
+        completion = OllamaClient().generate_completion("Explain fractals.", "model", stream=True, include_start_response_str=False)
+
+        assert completion.startswith("Sure!")
+        assert server.requests == 2
+
+
+def test_stalled_stream_gives_up_after_the_request_attempts(tracker, short_idle_timeout, monkeypatch):
+    with StallingOllamaServer(stalled_requests=REQUEST_ATTEMPTS) as server:
+        monkeypatch.setattr(OllamaClient(), "base_url", server.base_url)
+        completion = OllamaClient().generate_completion("Explain fractals.", "model", stream=True, include_start_response_str=False)
+
+        assert completion == ""
+        assert server.requests == REQUEST_ATTEMPTS
@@ -0,0 +1,64 @@
+import urllib.request
+
+from classes.cls_metrics import CONTENT_TYPE, MetricsRegistry, start_metrics_server
+
+
+def test_counter_and_gauge_exposition():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests answered", ("route", "status"))
+    requests.inc(route="/getEpisode", status="200")
+    requests.inc(2, route='/get"Audio\\', status="206")
+    registry.gauge("queue_length", "Episodes waiting", callback=lambda: 3)
+    registry.gauge("episodes", "Episodes per state", ("state",), callback=lambda: {("released",): 7, ("unreleased",): 0.5})
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests answered",
+        "# TYPE requests_total counter",
+        'requests_total{route="/getEpisode",status="200"} 1',
+        'requests_total{route="/get\\"Audio\\\\",status="206"} 2',
+        "# HELP queue_length Episodes waiting",
+        "# TYPE queue_length gauge",
+        "queue_length 3",
+        "# HELP episodes Episodes per state",
+        "# TYPE episodes gauge",
+        'episodes{state="released"} 7',
+        'episodes{state="unreleased"} 0.5',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 4.25",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_broken_callback_does_not_fail_the_scrape():
+    registry = MetricsRegistry()
+    registry.gauge("broken", "Raises", callback=lambda: 1 / 0)
+    registry.counter("working_total", "Works").inc()
+
+    lines = registry.render().splitlines()
+    assert "# broken unavailable: division by zero" in lines
+    assert "working_total 1" in lines
+
+
+def test_metrics_server_serves_the_registry():
+    registry = MetricsRegistry()
+    registry.counter("completions_total", "Completions", ("model",)).inc(model="phi3")
+    server = start_metrics_server(0, "127.0.0.1", registry)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+            assert 'completions_total{model="phi3"} 1' in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
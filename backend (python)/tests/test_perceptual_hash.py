@@ -0,0 +1,62 @@
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from classes import cls_perceptual_hash
+from classes.cls_perceptual_hash import PerceptualHashIndex, perceptual_hashes
+
+INDEX_FILE = "./cache/perceptual_hashes.json"
+
+
+def encode(image: Image.Image, format: str = "PNG", **options) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+
+def picture(seed: int) -> Image.Image:
+    pixels = np.random.default_rng(seed).integers(0, 256, (16, 16, 3), dtype=np.uint8)
+    return Image.fromarray(pixels).resize((400, 400), Image.Resampling.BICUBIC)
+
+
+def test_rescaled_and_reencoded_copy_is_a_duplicate():
+    index = PerceptualHashIndex(INDEX_FILE)
+    original = picture(1)
+    entry = index.add(*perceptual_hashes(encode(original)), "original")
+
+    copy = original.resize((300, 300))
+    assert index.find(*perceptual_hashes(encode(copy, "JPEG", quality=70))) is entry
+    assert index.find(*perceptual_hashes(encode(picture(2)))) is None
+
+
+def test_used_images_survive_a_restart():
+    index = PerceptualHashIndex(INDEX_FILE)
+    hashes = perceptual_hashes(encode(picture(1)))
+    index.stage_use(index.add(*hashes, "original"), "Fractals")
+    index.commit_uses("Fractals")
+
+    entry = PerceptualHashIndex(INDEX_FILE).find(*hashes)
+    assert entry is not None
+    assert entry["used_in"] == ["Fractals"]
+
+
+def test_unused_images_are_pruned_by_age_and_count(monkeypatch):
+    monkeypatch.setattr(cls_perceptual_hash, "MAX_UNUSED_ENTRIES", 2)
+    index = PerceptualHashIndex(INDEX_FILE)
+    used, expired, old, new, staged = [perceptual_hashes(encode(picture(seed))) for seed in range(5)]
+    index.mark_used(index.add(*used, "used"), "Fractals")
+    index.add(*expired, "expired")["added_at"] = time.time() - cls_perceptual_hash.UNUSED_ENTRY_TTL
+    index.add(*old, "old")["added_at"] = time.time() - 60
+    index.add(*new, "new")
+    index.stage_use(index.add(*staged, "staged"), "Black Holes")
+    index.save()
+
+    assert [entry["image_hash"] for entry in index.entries] == ["used", "old", "new", "staged"]
+    index.discard_uses("Black Holes")
+    index.save()
+    restored = PerceptualHashIndex(INDEX_FILE)
+    assert [entry["image_hash"] for entry in restored.entries] == ["used", "new", "staged"]
+    assert restored.find(*old) is None
+    assert restored.find(*staged) is not None
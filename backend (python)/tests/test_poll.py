@@ -0,0 +1,79 @@
+from classes.cls_poll import Poll, PollOption, VoteAggregator, parse_vote
+from classes.cls_poll_service import PollService
+
+
+def options():
+    return [PollOption("A", 0, "Fractals"), PollOption("B", 0, "Black Holes"), PollOption("C", 0, "Cellular Automata")]
+
+
+def test_parse_vote_accepts_common_spellings():
+    assert parse_vote("A") == "A"
+    assert parse_vote("b!") == "B"
+    assert parse_vote("  c.  ") == "C"
+    assert parse_vote("vote A") == "A"
+    assert parse_vote("Vote: (c)") == "C"
+    assert parse_vote("option #b") == "B"
+
+
+def test_parse_vote_rejects_chat():
+    assert parse_vote("") is None
+    assert parse_vote("AB") is None
+    assert parse_vote("a great episode") is None
+    assert parse_vote("vote for A please, it is the best") is None
+
+
+def test_one_vote_per_author():
+    aggregator = VoteAggregator(options())
+
+    assert aggregator.add("alice", "A")
+    assert not aggregator.add("alice", "a!")  # same option again changes nothing
+    assert aggregator.add("alice", "B")  # voting again moves the vote
+    assert aggregator.add("bob", "B")
+
+    assert aggregator.options["A"].votes == 0
+    assert aggregator.options["B"].votes == 2
+    assert aggregator.total == 2
+    assert aggregator.percentage("B") == 100.0
+
+
+def test_messages_without_author_count_each():
+    aggregator = VoteAggregator(options())
+
+    assert aggregator.add("", "A")
+    assert aggregator.add("", "A")
+    assert not aggregator.add("", "D")  # no such option
+    assert not aggregator.add("carol", "hello")
+
+    assert aggregator.options["A"].votes == 2
+    assert aggregator.total == 2
+    assert aggregator.percentage("C") == 0.0
+
+
+def test_percentage_of_empty_poll():
+    assert VoteAggregator(options()).percentage("A") == 0.0
+
+
+def test_voters_survive_the_poll_file(tmp_path):
+    poll = Poll()
+    poll.pollOptions = options()
+    poll.aggregator = VoteAggregator(poll.pollOptions)
+    poll.update_votes("A", "alice")
+    poll_file = str(tmp_path / "poll_votes.json")
+    poll.to_file(poll_file)
+
+    restored = Poll.from_file(poll_file)
+    assert not restored.update_votes("A", "alice")
+    assert restored.update_votes("C", "alice")
+    assert restored.aggregator.options["A"].votes == 0
+    assert restored.aggregator.options["C"].votes == 1
+    assert restored.aggregator.total == 1
+
+
+def test_corrupt_poll_snapshot_starts_an_empty_poll(tmp_path):
+    poll_file = tmp_path / "poll_votes.json"
+    poll_file.write_text('{"pollOptions": [{"letter": "A", "vot')
+
+    poll_service = PollService(str(poll_file))
+
+    assert poll_service.poll.pollOptions == []
+    assert poll_service.poll.aggregator.total == 0
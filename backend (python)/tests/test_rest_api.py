@@ -0,0 +1,158 @@
+import base64
+import gzip
+import json
+import os
+import threading
+
+import pytest
+
+from classes.cls_episode_index import WIP_EPISODES_PATH, EpisodeIndex, mark_ready, state_directory
+from classes.cls_episode_meta import EpisodeMeta
+from scripts.restApi import AUDIO_MAX_AGE, create_app, gzipped_copy
+
+AUDIO = b"RIFF" + bytes(range(256)) * 4
+
+
+def publish_episode(state, name, ready=True):
+    episode_path = os.path.join(WIP_EPISODES_PATH if state == "WIP" else state_directory(state), name)
+    os.makedirs(episode_path)
+    EpisodeMeta(name, [], 5, created_at=1.0).save(episode_path)
+    actions = {"actions": [{"character": "Teacher", "text": "Hello"}], "displayable_content": {"blackboard_text": "Fractals"}}
+    with open(episode_path + "/actions.json", "w") as file:
+        json.dump(actions, file)
+    with open(episode_path + "/0_Teacher.wav", "wb") as file:
+        file.write(AUDIO)
+    if ready:
+        mark_ready(episode_path)
+    return episode_path
+
+
+def get_json(client, path, **query):
+    return client.get(path, query_string=query).json
+
+
+@pytest.fixture
+def client():
+    publish_episode("unreleased", "0_model_Fractals")
+    app = create_app()
+    yield app.test_client()
+    app.extensions["llm_classroom"].poll_service.stop()
+
+
+def test_episode_is_revalidated_by_etag(client):
+    path = "./cache/shared/StreamingAssets/unreleased_episodes/0_model_Fractals"
+    response = client.get("/getEpisode", query_string={"path": path})
+    assert response.status_code == 200
+    assert response.json["actions"][0]["text"] == "Hello"
+
+    revalidated = client.get("/getEpisode", query_string={"path": path}, headers={"If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+
+
+def test_episode_is_gzipped_when_accepted(client):
+    path = "./cache/shared/StreamingAssets/unreleased_episodes/0_model_Fractals"
+    response = client.get("/getEpisode", query_string={"path": path}, headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert json.loads(gzip.decompress(response.data))["actions"][0]["text"] == "Hello"
+
+    refused = client.get("/getEpisode", query_string={"path": path}, headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in refused.headers
+    assert refused.json["actions"][0]["text"] == "Hello"
+
+
+def test_concurrent_gzipped_copies_do_not_collide(tmp_path):
+    file_path = str(tmp_path / "actions.json")
+    with open(file_path, "w") as file:
+        json.dump({"actions": ["Hello"] * 1000}, file)
+    errors = []
+
+    def compress():
+        try:
+            gzipped_copy(file_path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=compress) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert json.loads(gzip.decompress(open(file_path + ".gz", "rb").read()))["actions"][0] == "Hello"
+    assert sorted(os.listdir(tmp_path)) == ["actions.json", "actions.json.gz"]
+
+
+def test_audio_range_requests_are_answered_partially(client):
+    query = {"episodePath": "./cache/shared/StreamingAssets/unreleased_episodes/0_model_Fractals", "character": "Teacher", "actionIndex": 0}
+    response = client.get("/getAudio", query_string=query, headers={"Range": "bytes=4-103"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 4-103/{len(AUDIO)}"
+    assert response.data == AUDIO[4:104]
+
+    full = client.get("/getAudio", query_string=query)
+    assert full.status_code == 200
+    assert full.headers["Accept-Ranges"] == "bytes"
+    assert client.get("/getAudio", query_string=query, headers={"If-None-Match": full.headers["ETag"]}).status_code == 304
+
+
+def test_only_versioned_audio_urls_are_cached_for_long(client):
+    path = "./cache/shared/StreamingAssets/unreleased_episodes/0_model_Fractals"
+    manifest = client.get("/getAudioManifest", query_string={"episodePath": path}).json
+    versioned = client.get(manifest["audio"][0]["url"])
+    assert versioned.headers["Cache-Control"] == f"public, max-age={AUDIO_MAX_AGE}, immutable"
+    assert versioned.data == AUDIO
+
+    query = {"episodePath": path, "character": "Teacher", "actionIndex": 0}
+    assert client.get("/getAudio", query_string=query).headers["Cache-Control"] == "no-cache"
+    assert client.get("/getAudio", query_string={**query, "v": "outdated"}).headers["Cache-Control"] == "no-cache"
+
+
+def test_reservations_survive_a_restart():
+    publish_episode("unreleased", "0_model_Fractals")
+    publish_episode("unreleased", "1_model_Black Holes")
+    publish_episode("unreleased", "2_model_Cellular Automata")
+    app = create_app()
+    reserved = get_json(app.test_client(), "/reserveEpisodes", count=2)["episodes"]
+    app.extensions["llm_classroom"].poll_service.stop()
+    assert [os.path.basename(episode["episode_path"]) for episode in reserved] == ["0_model_Fractals", "1_model_Black Holes"]
+    assert reserved[0]["episode"]["actions"][0]["text"] == "Hello"
+    assert reserved[0]["audio"][0]["file"] == "0_Teacher.wav"
+
+    restarted = create_app()
+    client = restarted.test_client()
+    assert [episode["episode_path"] for episode in get_json(client, "/reserveEpisodes", count=1)["episodes"]] == [reserved[0]["episode_path"]]
+    played = [os.path.basename(get_json(client, "/chooseEpisodePath")["episode_path"]) for _ in range(3)]
+    restarted.extensions["llm_classroom"].poll_service.stop()
+    assert played == ["0_model_Fractals", "1_model_Black Holes", "2_model_Cellular Automata"]
+
+
+def test_unready_episodes_are_never_served(client):
+    unready_path = publish_episode("unreleased", "1_model_Black Holes", ready=False)  # e.g. left behind half-copied
+    wip_path = publish_episode("WIP", "2_model_Cellular Automata", ready=False)
+
+    assert client.get("/getEpisode", query_string={"path": unready_path}).status_code == 404
+    assert client.get("/getEpisode", query_string={"path": wip_path}).status_code == 404
+    assert os.path.basename(client.get("/chooseEpisodePath").json["episode_path"]) == "0_model_Fractals"
+
+    EpisodeIndex().publish(wip_path, "2_model_Cellular Automata")  # by the generator, through its own connection
+    released_path = client.get("/chooseEpisodePath").json["episode_path"]
+    assert os.path.basename(released_path) == "2_model_Cellular Automata"
+    assert client.get("/getEpisode", query_string={"path": released_path}).json["actions"][0]["text"] == "Hello"
+
+
+def test_sidecar_image_is_inlined_unless_loaded_by_url(client):
+    path = "./cache/shared/StreamingAssets/unreleased_episodes/0_model_Fractals"
+    image = b"\x89PNG\r\n\x1a\n" + bytes(100)
+    with open(path + "/blackboard_image.png", "wb") as file:
+        file.write(image)
+
+    inlined = client.get("/getEpisode", query_string={"path": path})
+    assert base64.b64decode(inlined.json["displayable_content"]["blackboard_image"]) == image
+    assert client.get("/getEpisode", query_string={"path": path}, headers={"If-None-Match": inlined.headers["ETag"]}).status_code == 304
+
+    by_url = client.get("/getEpisode", query_string={"path": path, "image": "url"})
+    assert "blackboard_image" not in by_url.json["displayable_content"]
+    assert client.get("/getImage", query_string={"episodePath": path}).data == image
@@ -0,0 +1,49 @@
+import time
+
+from classes import cls_scraper_cache
+from classes.cls_scraper_cache import URL_FAILURE_TTL, URL_TTL, VERDICT_TTL, ScraperCache
+
+CACHE_FILE = "./cache/scraper_cache.json"
+
+
+def age(entry, seconds):
+    entry["timestamp"] = time.time() - seconds
+
+
+def test_failed_urls_are_retried_sooner_than_working_ones():
+    cache = ScraperCache(CACHE_FILE)
+    cache.record_url("https://example.com/ok.png", "ok", "a" * 64, 800, 600)
+    cache.record_url("https://example.com/broken.png", "failed")
+    age(cache.urls["https://example.com/ok.png"], URL_FAILURE_TTL + 1)
+    age(cache.urls["https://example.com/broken.png"], URL_FAILURE_TTL + 1)
+
+    entry = cache.get_url("https://example.com/ok.png")
+    assert entry is not None and entry["width"] == 800
+    assert cache.get_url("https://example.com/broken.png") is None
+    age(cache.urls["https://example.com/ok.png"], URL_TTL + 1)
+    assert cache.get_url("https://example.com/ok.png") is None
+
+
+def test_verdicts_survive_a_restart_until_they_expire():
+    cache = ScraperCache(CACHE_FILE)
+    cache.record_verdict("fresh", "Fractals", True)
+    cache.record_verdict("expired", "Fractals", True)
+    cache.images["expired"]["verdicts"]["Fractals"]["timestamp"] -= VERDICT_TTL
+    cache.save()
+
+    restored = ScraperCache(CACHE_FILE)
+    assert restored.get_verdict("fresh", "Fractals") is True
+    assert restored.get_verdict("fresh", "Black Holes") is None
+    assert restored.get_verdict("expired", "Fractals") is None
+    assert "expired" not in restored.images  # no verdict and no description left
+
+
+def test_oldest_urls_beyond_the_limit_are_pruned_on_save(monkeypatch):
+    monkeypatch.setattr(cls_scraper_cache, "MAX_URL_ENTRIES", 2)
+    cache = ScraperCache(CACHE_FILE)
+    for i in range(4):
+        cache.record_url(f"https://example.com/{i}.png", "ok", str(i))
+        age(cache.urls[f"https://example.com/{i}.png"], 100 - i)
+    cache.save()
+
+    assert sorted(ScraperCache(CACHE_FILE).urls) == ["https://example.com/2.png", "https://example.com/3.png"]
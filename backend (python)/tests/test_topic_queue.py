@@ -0,0 +1,85 @@
+import json
+
+from classes.cls_chat_log import ChatLog
+from classes.cls_chat_topic_pipeline import ChatTopicPipeline, parse_topics
+from classes.cls_episode_index import EpisodeIndex
+from classes.cls_episode_meta import EpisodeMeta
+from classes.cls_topic_queue import TopicQueue, normalize_title
+from interface.cls_few_shot_factory import FewShotProvider
+from interface.cls_livestream_message import LivestreamMessage
+
+
+def test_normalize_title():
+    assert normalize_title("The  Fractals!") == "fractals"
+    assert normalize_title("A Random-Walk") == "random walk"
+    assert normalize_title("Theory of Mind") == "theory of mind"
+
+
+def test_most_requested_topic_comes_first():
+    queue = TopicQueue("./cache/shared/topic_queue.json")
+    queue.push("Fractals")
+    queue.push("Black Holes")
+    queue.push("Cellular Automata")
+    queue.push("black holes!")
+
+    assert queue.pop() == "Black Holes"
+    assert queue.pop() == "Fractals"  # ties go to the oldest request
+    assert queue.pop() == "Cellular Automata"
+    assert queue.pop() is None
+
+
+def test_raised_priority_overtakes_older_topics():
+    queue = TopicQueue("./cache/shared/topic_queue.json")
+    queue.push("Fractals")
+    queue.push("Black Holes")
+    queue.push("Black Holes")
+    queue.push("Fractals")
+    queue.push("Fractals")
+
+    assert queue.pop() == "Fractals"
+    assert queue.pop() == "Black Holes"
+    assert len(queue) == 0
+
+
+def test_queue_survives_a_restart():
+    queue = TopicQueue("./cache/shared/topic_queue.json")
+    queue.push("Fractals")
+    queue.push("Black Holes")
+    queue.push("Black Holes")
+    queue.chat_offset = 42
+    queue.save()
+
+    restored = TopicQueue("./cache/shared/topic_queue.json")
+    assert restored.chat_offset == 42
+    assert "black holes" in restored
+    assert [restored.pop(), restored.pop()] == ["Black Holes", "Fractals"]
+
+
+def test_parse_topics():
+    assert parse_topics('Sure! ["Fractals", " Black Holes ", ""]') == ["Fractals", "Black Holes"]
+    assert parse_topics("Fractals, 'Black Holes'") == ["Fractals", "Black Holes"]
+
+
+def test_first_run_starts_at_the_end_of_the_chat_log(monkeypatch):
+    chat_log = ChatLog("./cache/chat_log.jsonl", "./cache/fullChat.json")
+    chat_log.append([LivestreamMessage("alice", "Please explain quantum entanglement", "1")])
+    index = EpisodeIndex("./cache/shared/episode_index.sqlite3")
+    requested = []
+
+    def extract_topics(messages, llm):
+        requested.append(messages)
+        return '["Black Holes", "Fractals"]'
+
+    monkeypatch.setattr(FewShotProvider, "few_shot_LivestreamMessagesToTopics", extract_topics)
+    index.add("0_model_Fractals", "released", EpisodeMeta("Fractals", [], 5))
+    pipeline = ChatTopicPipeline(chat_log, TopicQueue("./cache/shared/topic_queue.json"), index, "model")
+
+    assert pipeline.process_new_messages() == []
+    assert requested == []
+
+    chat_log.append([LivestreamMessage("bob", "vote A", "2"), LivestreamMessage("carol", "What about black holes?", "3")])
+    assert pipeline.process_new_messages() == ["Black Holes"]  # Fractals already has an episode
+    assert [[message.id for message in messages] for messages in requested] == [["3"]]  # votes are no topic requests
+
+    with open("./cache/shared/topic_queue.json", "r") as file:
+        assert json.load(file)["chat_offset"] == chat_log.end_offset()
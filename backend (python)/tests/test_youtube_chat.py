@@ -0,0 +1,65 @@
+from interface.cls_fake_youtube import FAKE_LIVE_CHAT_ID, FakeYouTube
+from interface.cls_youtube_chat import MAX_RESULTS, LiveChatReader
+
+
+def make_reader(polling_interval_millis: int = 2000):
+    youtube = FakeYouTube(polling_interval_millis=polling_interval_millis)
+    return youtube, LiveChatReader(youtube, FAKE_LIVE_CHAT_ID)
+
+
+def test_every_fetch_costs_one_request():
+    youtube, reader = make_reader()
+    for i in range(5):
+        youtube.add_message(f"viewer{i}", "vote A")
+
+    messages, _ = reader.fetch_new_messages()
+
+    assert [message.author for message in messages] == [f"viewer{i}" for i in range(5)]
+    assert youtube.requests == 1
+
+
+def test_messages_are_fetched_once():
+    youtube, reader = make_reader()
+    youtube.add_message("alice", "A")
+    first, _ = reader.fetch_new_messages()
+    youtube.add_message("bob", "B")
+    youtube.add_message("carol", "C")
+    second, _ = reader.fetch_new_messages()
+
+    assert [message.id for message in first] == ["fake-message-0"]
+    assert [message.id for message in second] == ["fake-message-1", "fake-message-2"]
+
+
+def test_empty_page_waits_for_the_polling_interval():
+    youtube, reader = make_reader(polling_interval_millis=3500)
+    youtube.add_message("alice", "A")
+    reader.fetch_new_messages()
+
+    messages, wait_seconds = reader.fetch_new_messages()
+
+    assert messages == []
+    assert wait_seconds == 3.5
+    assert youtube.requests == 2
+    assert reader.page_token == "1"
+
+
+def test_polling_interval_follows_the_response():
+    youtube, reader = make_reader(polling_interval_millis=2000)
+    assert reader.fetch_new_messages()[1] == 2.0
+
+    youtube.polling_interval_millis = 10000
+    assert reader.fetch_new_messages()[1] == 10.0
+
+
+def test_backlog_is_caught_up_one_page_per_fetch():
+    youtube, reader = make_reader()
+    reader.fetch_new_messages()
+    for i in range(MAX_RESULTS + 10):
+        youtube.add_message(f"viewer{i}", "hello!")
+
+    first, _ = reader.fetch_new_messages()
+    second, _ = reader.fetch_new_messages()
+
+    assert len(first) == MAX_RESULTS
+    assert len(second) == 10
+    assert youtube.requests == 3